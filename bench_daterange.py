@@ -0,0 +1,280 @@
+"""
+Benchmarks for the DateRange set operations on synthetic workloads.
+
+Run the benchmarks and save the results:
+    python -m bench_daterange run --sizes 10 1000 100000 --output before.json
+Compare two result files, exiting with 1 if anything regressed:
+    python -m bench_daterange compare before.json after.json --threshold 0.1
+Compare pickling round trips and payload sizes against the default slot pickling:
+    python -m bench_daterange pickle --sizes 10 1000 100000
+
+For every workload, size and operation this reports the operations per second, the peak
+memory traced by tracemalloc during one operation, and the memory blocks the operation
+allocated that are still held with its result (from the count differences of tracemalloc
+snapshots, so the objects it created and kept rather than every temporary allocation).
+"""
+import argparse
+import copyreg
+import io
+import json
+import pickle
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date
+from typing import Callable, Dict, List, Tuple
+
+from daterange import DateRange
+
+_FIRST = date(1990, 1, 1).toordinal()
+_SEED = 20211001
+
+
+def _from_ordinals(intervals: List[Tuple[int, int]]) -> DateRange:
+    return DateRange.from_list([(date.fromordinal(start), date.fromordinal(end)) for start, end in intervals])
+
+
+def _blocks(rng: random.Random, size: int, length: Tuple[int, int], gap: Tuple[int, int]) -> List[Tuple[int, int]]:
+    intervals = []
+    start = _FIRST + rng.randint(*gap)
+    for _ in range(size):
+        end = start + rng.randint(*length) - 1
+        intervals.append((start, end))
+        start = end + 1 + rng.randint(*gap)
+    return intervals
+
+
+def dense(rng: random.Random, size: int) -> Tuple[DateRange, DateRange]:
+    """Long intervals with short gaps, the two operands overlap a lot"""
+    return (_from_ordinals(_blocks(rng, size, (20, 60), (1, 5))),
+            _from_ordinals(_blocks(rng, size, (20, 60), (1, 5))))
+
+
+def sparse(rng: random.Random, size: int) -> Tuple[DateRange, DateRange]:
+    """Short intervals with long gaps, the two operands rarely overlap"""
+    return (_from_ordinals(_blocks(rng, size, (1, 3), (30, 90))),
+            _from_ordinals(_blocks(rng, size, (1, 3), (30, 90))))
+
+
+def fragmented(rng: random.Random, size: int) -> Tuple[DateRange, DateRange]:
+    """Single days with one or two day gaps"""
+    return (_from_ordinals(_blocks(rng, size, (1, 1), (1, 2))),
+            _from_ordinals(_blocks(rng, size, (1, 1), (1, 2))))
+
+
+def butted(rng: random.Random, size: int) -> Tuple[DateRange, DateRange]:
+    """Alternating blocks split between the operands so every union coalesces butted intervals"""
+    intervals = _blocks(rng, 2 * size, (1, 10), (0, 0))
+    return _from_ordinals(intervals[0::2]), _from_ordinals(intervals[1::2])
+
+
+def wrap_around(rng: random.Random, size: int) -> Tuple[DateRange, DateRange]:
+    """Fragmented ranges that also reach the beginning and end of time, as DateRange(start, end) does for start > end"""
+    left, right = fragmented(rng, max(size - 2, 0))
+    outside = DateRange(date.fromordinal(_FIRST + 4 * size), date.fromordinal(_FIRST - 1))
+    return left | outside, right | DateRange(date.fromordinal(_FIRST + 5 * size), date.fromordinal(_FIRST + 2))
+
+
+WORKLOADS: Dict[str, Callable[[random.Random, int], Tuple[DateRange, DateRange]]] = {
+    'dense': dense,
+    'sparse': sparse,
+    'fragmented': fragmented,
+    'butted': butted,
+    'wrap_around': wrap_around,
+}
+
+
+def operations(left: DateRange, right: DateRange, rng: random.Random) -> Dict[str, Callable[[], object]]:
+    lower, upper = left.earliest.toordinal(), left.latest.toordinal()
+    lower, upper = max(lower, _FIRST - 10), min(upper, _FIRST + 200 * len(left))
+    days = [date.fromordinal(rng.randint(lower, upper)) for _ in range(1000)]
+    small = DateRange.from_list(days[:10])
+    items = list(left) + days
+    # contains_date checks a batch of 1000 dates per operation
+    return {
+        'union': lambda: left | right,
+        'intersect': lambda: left & right,
+        'subtract': lambda: left - right,
+        'contains_date': lambda: [day in left for day in days],
+        'contains_range': lambda: small in left,
+        'from_list': lambda: DateRange.from_list(items),
+    }
+
+
+def _ops_per_sec(operation: Callable[[], object], min_time: float) -> float:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            operation()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return number / elapsed
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed * 1.2))
+
+
+def _memory(operation: Callable[[], object]) -> Tuple[int, int]:
+    """The peak bytes traced during one operation and the blocks allocated by another that its result holds"""
+    # The snapshots are left out of the counts
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    try:
+        result = operation()
+        _, peak = tracemalloc.get_traced_memory()
+        del result
+        before = tracemalloc.take_snapshot()
+        result = operation()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    # Filtered only once both are taken, so nothing else runs between them
+    statistics = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'filename')
+    return peak, sum(statistic.count_diff for statistic in statistics)
+
+
+def run(sizes: List[int], workloads: List[str], min_time: float) -> List[dict]:
+    results = []
+    for name in workloads:
+        for size in sizes:
+            rng = random.Random(f"{_SEED}-{name}-{size}")
+            left, right = WORKLOADS[name](rng, size)
+            for operation_name, operation in operations(left, right, rng).items():
+                peak, blocks = _memory(operation)
+                result = {
+                    'workload': name,
+                    'size': size,
+                    'operation': operation_name,
+                    'ops_per_sec': _ops_per_sec(operation, min_time),
+                    'peak_bytes': peak,
+                    'retained_blocks': blocks,
+                }
+                results.append(result)
+                print(f"{name:>12} {size:>8} {operation_name:>15} {result['ops_per_sec']:>14.2f} ops/s "
+                      f"{peak:>12} peak bytes {blocks:>8} retained blocks")
+    return results
+
+
+def _dump(date_range: DateRange, protocol: int, default: bool, out_of_band: bool) -> Tuple[bytes, list]:
+    """Pickle a range, with the reduction pickle uses for slots and no __reduce_ex__ if default"""
+    buffers = []
+    file = io.BytesIO()
+    pickler = pickle.Pickler(file, protocol, buffer_callback=buffers.append if out_of_band else None)
+    if default:
+        pickler.dispatch_table = copyreg.dispatch_table.copy()
+        pickler.dispatch_table[type(date_range)] = lambda obj: object.__reduce_ex__(obj, protocol)
+    pickler.dump(date_range)
+    return file.getvalue(), buffers
+
+
+def pickle_methods(date_range: DateRange) -> Dict[str, Tuple[Callable[[], object], int]]:
+    """Each way of pickling a range as a round trip to time and the bytes it transfers"""
+    def method(protocol: int, default: bool = False, out_of_band: bool = False) -> Tuple[Callable[[], object], int]:
+        def round_trip():
+            data, buffers = _dump(date_range, protocol, default, out_of_band)
+            return pickle.loads(data, buffers=buffers)
+
+        data, buffers = _dump(date_range, protocol, default, out_of_band)
+        return round_trip, len(data) + sum(buffer.raw().nbytes for buffer in buffers)
+
+    intervals = date_range.intervals
+    return {
+        'intervals_list': (lambda: pickle.loads(pickle.dumps(intervals, 4)), len(pickle.dumps(intervals, 4))),
+        'default_slots': method(4, default=True),
+        'protocol_4': method(4),
+        'protocol_5': method(5),
+        'protocol_5_out_of_band': method(5, out_of_band=True),
+    }
+
+
+def run_pickle(sizes: List[int], workloads: List[str], min_time: float) -> List[dict]:
+    results = []
+    for name in workloads:
+        for size in sizes:
+            rng = random.Random(f"{_SEED}-{name}-{size}")
+            date_range, _ = WORKLOADS[name](rng, size)
+            for method, (round_trip, payload) in pickle_methods(date_range).items():
+                result = {
+                    'workload': name,
+                    'size': size,
+                    'operation': f'pickle_{method}',
+                    'ops_per_sec': _ops_per_sec(round_trip, min_time),
+                    'payload_bytes': payload,
+                }
+                results.append(result)
+                print(f"{name:>12} {size:>8} {method:>22} {result['ops_per_sec']:>14.2f} round trips/s "
+                      f"{result['payload_bytes']:>12} bytes")
+    return results
+
+
+# Increases of up to this much more than the threshold are noise
+_MEASURE_SLACK = {'peak_bytes': 1024, 'payload_bytes': 1024, 'retained_blocks': 16}
+
+
+def compare(baseline: List[dict], current: List[dict], threshold: float) -> List[str]:
+    """Describe every result that is more than threshold slower, or uses that much more memory, than the baseline"""
+    baseline = {(result['workload'], result['size'], result['operation']): result for result in baseline}
+    regressions = []
+    for result in current:
+        key = (result['workload'], result['size'], result['operation'])
+        if key not in baseline:
+            continue
+        before = baseline[key]
+        name = '{} {} {}'.format(*key)
+        if result['ops_per_sec'] < before['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{name}: {before['ops_per_sec']:.2f} -> {result['ops_per_sec']:.2f} ops/s")
+        for measure, slack in _MEASURE_SLACK.items():
+            if measure in result and measure in before and result[measure] > before[measure] * (1 + threshold) + slack:
+                regressions.append(f"{name}: {before[measure]} -> {result[measure]} {measure.replace('_', ' ')}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m bench_daterange', description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000],
+                            help='number of intervals per operand, up to 1000000')
+    run_parser.add_argument('--workloads', nargs='+', choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    run_parser.add_argument('--min-time', type=float, default=0.2, help='seconds to time each operation for')
+    run_parser.add_argument('--output', help='write the results to this JSON file')
+
+    pickle_parser = commands.add_parser('pickle', help='benchmark pickling round trips')
+    pickle_parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000],
+                               help='number of intervals per range, up to 1000000')
+    pickle_parser.add_argument('--workloads', nargs='+', choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    pickle_parser.add_argument('--min-time', type=float, default=0.2, help='seconds to time each round trip for')
+    pickle_parser.add_argument('--output', help='write the results to this JSON file')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='fraction slower or larger that counts as a regression')
+
+    args = parser.parse_args(argv)
+    if args.command in ('run', 'pickle'):
+        results = (run if args.command == 'run' else run_pickle)(args.sizes, args.workloads, args.min_time)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                           'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, file, indent=2)
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)['results']
+    with open(args.current) as file:
+        current = json.load(file)['results']
+    regressions = compare(baseline, current, args.threshold)
+    for regression in regressions:
+        print(regression)
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,127 @@
+import heapq
+import mmap
+import os
+import struct
+import sys
+from pickle import PickleBuffer
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import timedelta, date
-from typing import Optional, Union, List
+from functools import lru_cache, wraps
+from itertools import accumulate, groupby, islice
+from operator import itemgetter, and_, or_, sub, xor
+from time import perf_counter
+from typing import Optional, Union, List, Iterator, Tuple, Iterable, Hashable, Mapping, Dict, Callable, NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only used for batch operations
+    np = None
 
 _DAY = timedelta(days=1)
+# Intervals are stored as ordinals (date.toordinal()) in compact int arrays
+_TYPECODE = 'i'
+_MIN = date.min.toordinal()
+_MAX = date.max.toordinal()
+# The ordinal of day zero of numpy's datetime64
+_EPOCH = date(1970, 1, 1).toordinal()
+
+# Binary format: a header (magic, version, kind, count) followed, for a single range, by
+# the int32 starts then the int32 ends of its intervals. A collection has an uint64
+# offsets table of count + 1 interval positions after the header, then the starts of all
+# its ranges and then the ends, so every range is a slice of both blocks.
+# Everything is little-endian and the blocks stay aligned to their item size.
+_MAGIC = b'DRNG'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHHQ')
+_KIND_RANGE = 0
+_KIND_COLLECTION = 1
+_OFFSET_TYPECODE = 'Q'
+
+
+# The Gregorian calendar repeats every 400 years, which is this many days
+_GREGORIAN_CYCLE = 146097
+
+
+@lru_cache(maxsize=32)
+def _monthly_offsets(days: Tuple[int, ...]) -> Tuple[int, ...]:
+    """The offsets from the first of January of year 1 of the given days of the month over a Gregorian cycle"""
+    if not all(1 <= abs(day) <= 31 for day in days):
+        raise ValueError(f"Days of the month must be from 1 to 31 or -31 to -1: {days}")
+    offsets = []
+    for year in range(1, 401):
+        for month in range(1, 13):
+            first = date(year, month, 1).toordinal()
+            length = date(year + month // 12, month % 12 + 1, 1).toordinal() - first
+            offsets.extend(first - 1 + (day - 1 if day > 0 else length + day) for day in days if abs(day) <= length)
+    return tuple(offsets)
+
+
+# DateRanges with at least this many intervals and fewer days between their first and last
+# day than this many per interval are fragmented enough for their set operations to be done
+# on bitmaps, at most as large as the arrays of ordinals: 64 bits per pair of int32 ordinals.
+# The days spanned by both operands together are held to the same limit. Bitmaps are built
+# and decoded with numpy, without it building one costs more than merging the intervals.
+_BITMAP_MIN_INTERVALS = 64
+_BITMAP_DAYS_PER_INTERVAL = 64
+# Testing a bit shifts the whole bitmap, so larger ones look dates up in the intervals instead
+_BITMAP_TEST_BITS = 1 << 16
+
+_popcount = getattr(int, 'bit_count', None) or (lambda bits: bin(bits).count('1'))
+
+
+def _to_bitmap(starts: array, ends: array) -> Tuple[int, int]:
+    """
+    The days of sorted and coalesced ordinal intervals as (lower, bits), bit i of bits being
+    set for day lower + i, and lower the first day (or 0 without any days)
+    """
+    if not starts:
+        return 0, 0
+    lower = starts[0]
+    span = ends[-1] - lower + 1
+    # Mark where each interval starts and where the day after it is, then sum them up
+    marks = np.zeros(span + 1, dtype=np.int8)
+    marks[np.frombuffer(starts, dtype=np.intc) - lower] = 1
+    marks[np.frombuffer(ends, dtype=np.intc) - (lower - 1)] = -1
+    covered = np.cumsum(marks[:span], dtype=np.int8).astype(bool)
+    return lower, int.from_bytes(np.packbits(covered, bitorder='little').tobytes(), 'little')
+
+
+def _from_bitmap(lower: int, bits: int) -> Tuple[array, array]:
+    """The sorted and coalesced ordinal intervals of the days of a bitmap"""
+    covered = np.unpackbits(np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, 'little'), dtype=np.uint8),
+                            bitorder='little').astype(np.int8)
+    edges = np.diff(covered, prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1) + lower
+    ends = np.flatnonzero(edges == -1) + (lower - 1)
+    return array(_TYPECODE, starts.astype(np.intc).tobytes()), array(_TYPECODE, ends.astype(np.intc).tobytes())
+
+
+def _bitmap_operation(operation: Callable[[int, int], int],
+                      bitmap_1: Tuple[int, int], bitmap_2: Tuple[int, int]) -> Tuple[int, int]:
+    """Apply an operation to the aligned bits of two bitmaps, the result starting at its first day"""
+    lower = min((lower for lower, bits in (bitmap_1, bitmap_2) if bits), default=0)
+    bits = operation(bitmap_1[1] << (bitmap_1[0] - lower) if bitmap_1[1] else 0,
+                     bitmap_2[1] << (bitmap_2[0] - lower) if bitmap_2[1] else 0)
+    if not bits:
+        return 0, 0
+    shift = (bits & -bits).bit_length() - 1
+    return lower + shift, bits >> shift
+
+
+def _and_not(bits_1: int, bits_2: int) -> int:
+    return bits_1 & ~bits_2
 
 
 def type_check(func):
+    @wraps(func)
     def wrapper(*args, **kwargs):
         if not isinstance(args[1], DateRange):
             if isinstance(args[1], date):
                 day_range = DateRange(args[1], args[1])
+                if _instrumentation.enabled:
+                    _instrumentation.record('type_check', 1, 1, 0.0)
                 args = (args[0], day_range, *args[2:]) if len(args) > 2 else (args[0], day_range)
             else:
                 def not_implemented():
@@ -20,6 +133,233 @@ def type_check(func):
     return wrapper
 
 
+def _coalesce(intervals: Iterable[Tuple[int, int]]) -> Tuple[array, array]:
+    """Merge ordinal intervals sorted by start into disjoint arrays, joining overlapping and butted intervals"""
+    starts = array(_TYPECODE)
+    ends = array(_TYPECODE)
+    intervals = iter(intervals)
+
+    start, end = next(intervals, (None, None))
+    for next_start, next_end in intervals:
+        # Neither overlapping nor butted (see Interval.r_butted)
+        if next_start > end + 1:
+            starts.append(start)
+            ends.append(end)
+            start, end = next_start, next_end
+            continue
+
+        if next_end > end:
+            end = next_end
+
+    if start is not None:
+        starts.append(start)
+        ends.append(end)
+    return starts, ends
+
+
+def _pack(intervals: Iterable[Tuple[int, int]]) -> Tuple[array, array]:
+    """Store ordinal intervals that are already sorted, disjoint and coalesced"""
+    starts = array(_TYPECODE)
+    ends = array(_TYPECODE)
+    for start, end in intervals:
+        starts.append(start)
+        ends.append(end)
+    return starts, ends
+
+
+def _merge(intervals_1: Iterator[Tuple[int, int]],
+           intervals_2: Iterator[Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+    """Merge two sorted streams of (start, end) ordinals ordered by start and then by end"""
+    interval_1 = next(intervals_1, None)
+    interval_2 = next(intervals_2, None)
+    while interval_1 and interval_2:
+        # Tuples order by start and then by end
+        if interval_1 <= interval_2:
+            yield interval_1
+            interval_1 = next(intervals_1, None)
+            continue
+        yield interval_2
+        interval_2 = next(intervals_2, None)
+    if interval_1:
+        yield interval_1
+        yield from intervals_1
+    if interval_2:
+        yield interval_2
+        yield from intervals_2
+
+
+def _exclusive(intervals: Iterator[Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+    """
+    The days covered only once in a merged stream of intervals coming from two ranges.
+    The pieces are sorted but not coalesced.
+    """
+    start, end = next(intervals, (None, None))
+    for next_start, next_end in intervals:
+        if start is None:
+            start, end = next_start, next_end
+            continue
+        if next_start > end:
+            yield start, end
+            start, end = next_start, next_end
+            continue
+        # Overlapping, keep the part before the overlap and carry on with the part after it
+        if start < next_start:
+            yield start, next_start - 1
+        if next_end < end:
+            start = next_end + 1
+        elif next_end > end:
+            start, end = end + 1, next_end
+        else:
+            start = None
+    if start is not None:
+        yield start, end
+
+
+def _complement(intervals: Iterable[Tuple[int, int]], lower: int = _MIN, upper: int = _MAX) -> Iterator[Tuple[int, int]]:
+    """Yield the gaps between sorted and coalesced intervals that fall within lower and upper"""
+    gap_start = lower
+    for start, end in intervals:
+        if end < lower:
+            continue
+        if start > upper:
+            break
+        if start > gap_start:
+            yield gap_start, start - 1
+        gap_start = end + 1
+    if gap_start <= upper:
+        yield gap_start, upper
+
+
+def _coalesced(intervals: Iterable[Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+    """The streaming version of _coalesce, yielding the merged intervals instead of storing them"""
+    intervals = iter(intervals)
+    start, end = next(intervals, (None, None))
+    for next_start, next_end in intervals:
+        if next_start > end + 1:
+            yield start, end
+            start, end = next_start, next_end
+        elif next_end > end:
+            end = next_end
+    if start is not None:
+        yield start, end
+
+
+def _overlaps(intervals: Iterator[Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+    """
+    The intersection of a merged stream of intervals coming from two ranges, the streaming
+    version of DateRange._intersect. Intervals from the same range never overlap.
+    """
+    _, end = next(intervals, (None, None))
+    for next_start, next_end in intervals:
+        # Sorted by start, so only the ends decide the overlap
+        if next_start <= end:
+            yield next_start, next_end if next_end <= end else end
+        if next_end > end:
+            end = next_end
+
+
+def _boundaries(starts: array, ends: array) -> Iterator[Tuple[int, int]]:
+    """The (ordinal, change in depth) events of one range, the day after each end is where it stops counting"""
+    for start, end in zip(starts, ends):
+        yield start, 1
+        yield end + 1, -1
+
+
+def _depth_segments(ranges: Iterable['DateRange']) -> Iterator[Tuple[int, int, int]]:
+    """
+    Sweep over the boundaries of many ranges at once yielding (start, end, depth) for
+    each stretch of days covered by the same non-zero number of the ranges.
+    """
+    events = heapq.merge(*(_boundaries(_range._starts, _range._ends) for _range in ranges))
+    start, depth = None, 0
+    for position, changes in groupby(events, key=itemgetter(0)):
+        new_depth = depth + sum(change for _, change in changes)
+        if new_depth != depth:
+            if depth:
+                yield start, position - 1, depth
+            start, depth = position, new_depth
+
+
+def _ordinal_array(dates) -> 'np.ndarray':
+    """Convert a datetime64 array (or pandas column) or an iterable of dates to an int64 array of ordinals"""
+    values = np.asarray(dates)
+    if values.dtype.kind == 'M':
+        # NaT becomes the smallest int64 which is never within a range
+        return values.astype('datetime64[D]').astype(np.int64) + _EPOCH
+    return np.fromiter((day.toordinal() for day in values.ravel()), dtype=np.int64,
+                       count=values.size).reshape(values.shape)
+
+
+def _require_numpy(feature: str):
+    if np is None:
+        raise ImportError(f"numpy is required for {feature}")
+
+
+def _gallop_right(seq, value: int, lo: int = 0) -> int:
+    """
+    The same as bisect_right(seq, value, lo) but probes ahead of lo in growing
+    steps first, so it is cheap when the answer is close to lo.
+    """
+    hi = len(seq)
+    step = 1
+    while lo + step < hi and seq[lo + step] <= value:
+        lo += step
+        step *= 2
+    return bisect_right(seq, value, lo, min(lo + step, hi))
+
+
+def _little_endian(values: array) -> array:
+    """The values as stored in the binary format, byte swapped on big-endian machines"""
+    if sys.byteorder == 'little':
+        return values
+    values = array(values.typecode, values)
+    values.byteswap()
+    return values
+
+
+def _read_header(buffer: memoryview, kind: int) -> int:
+    """Check the header of the binary format and return the count it holds"""
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Data is too short for a DateRange header")
+    magic, version, found_kind, count = _HEADER.unpack_from(buffer)
+    if magic != _MAGIC:
+        raise ValueError("Data is not in the DateRange binary format")
+    if version != _VERSION:
+        raise ValueError(f"Unsupported DateRange binary format version: {version}")
+    if found_kind != kind:
+        raise ValueError("Data holds a DateRange collection" if found_kind == _KIND_COLLECTION
+                         else "Data holds a single DateRange")
+    return count
+
+
+def _view(buffer: memoryview, offset: int, count: int, typecode: str) -> Union[memoryview, array]:
+    """A typed view of count items at offset, a copy on big-endian machines"""
+    size = count * array(typecode).itemsize
+    if offset + size > len(buffer):
+        raise ValueError("Data is truncated")
+    if sys.byteorder == 'little':
+        return buffer[offset:offset + size].cast(typecode)
+    values = array(typecode, buffer[offset:offset + size].tobytes())
+    values.byteswap()
+    return values
+
+
+def _copy_ordinals(values: Union[array, memoryview]) -> array:
+    """Copy ordinals from an array or a typed view into a new array, as a plain memory copy"""
+    if isinstance(values, array):
+        return array(_TYPECODE, values)
+    copied = array(_TYPECODE)
+    copied.frombytes(values.cast('B'))
+    return copied
+
+
+def _unpickle(cls: type, starts, ends) -> 'DateRange':
+    """Rebuild a pickled DateRange from the little-endian buffers of its ordinals"""
+    starts, ends = memoryview(starts).cast('B'), memoryview(ends).cast('B')
+    count = len(starts) // array(_TYPECODE).itemsize
+    return cls._from_views(_view(starts, 0, count, _TYPECODE), _view(ends, 0, count, _TYPECODE))
+
+
 class DateRange:
     """
     Contains a range of dates that are not necessarily contiguous.
@@ -76,9 +416,13 @@ class DateRange:
     except for that between the start date and end date
     If the start day is exactly one day after the end day the range will be all
     time.
+
+    Internally the intervals are kept as two parallel arrays of ordinals
+    (see date.toordinal) and Interval objects are only created when the
+    intervals are iterated over.
     """
 
-    __slots__ = '_intervals'
+    __slots__ = '_starts', '_ends', '_cumdays', '_bitmap'
 
     class Interval:
         __slots__ = 'start', 'end'
@@ -160,6 +504,16 @@ class DateRange:
         def copy(self):
             return type(self)(self.start, self.end)
 
+        @classmethod
+        def from_ordinals(cls, start: int, end: int) -> 'DateRange.Interval':
+            return cls(date.fromordinal(start), date.fromordinal(end))
+
+        def ordinals(self) -> Tuple[int, int]:
+            return self.start.toordinal(), self.end.toordinal()
+
+        def __reduce__(self):
+            return type(self).from_ordinals, self.ordinals()
+
         @property
         def days(self) -> int:
             return self.delta().days + 1
@@ -167,12 +521,20 @@ class DateRange:
     def __init__(self,
                  start: Optional[date] = None,
                  end: Optional[date] = None):
-        self._intervals = []
+        self._starts = array(_TYPECODE)
+        self._ends = array(_TYPECODE)
+        self._cumdays = None
+        self._bitmap = None
         self._add_init_range(start, end)
 
     def _add_init_range(self, start, end):
+        for interval_start, interval_end in self._init_intervals(start, end):
+            self._append(interval_start, interval_end)
+
+    @classmethod
+    def _init_intervals(cls, start: Optional[date], end: Optional[date]) -> List[Tuple[int, int]]:
         if not start and not end:
-            return
+            return []
 
         if start and end:
             # If the start is larger than the end we use two intervals
@@ -181,263 +543,1915 @@ class DateRange:
             if start > end:
                 if start - end <= _DAY:
                     # All of time
-                    self._intervals.append(self.Interval(None, None))
-                    return
+                    return [(_MIN, _MAX)]
                 else:
-                    self._intervals.append(self.Interval(None, end))
-                    self._intervals.append(self.Interval(start, None))
-                    return
-        self._intervals.append(self.Interval(start, end))
+                    return [(_MIN, end.toordinal()), (start.toordinal(), _MAX)]
+        return [cls.Interval(start, end).ordinals()]
+
+    def _append(self, start: int, end: int):
+        self._starts.append(start)
+        self._ends.append(end)
+        self._cumdays = None
 
     @classmethod
-    def from_list(cls, ranges: List[Union['DateRange', 'DateRange.Interval', date]]) -> 'DateRange':
-        new = cls()
-        # TODO: use sorted for better performance
-        for item in ranges:
-            if isinstance(item, cls.Interval):
-                new_new = cls()
-                cls()._intervals = [item]
-                new += new_new
-            if isinstance(item, (DateRange, date)):
-                new += item
-                continue
-            raise TypeError(f'Cannot create range from type: {type(item)}')
+    def _from_ordinals(cls, starts: array, ends: array) -> 'DateRange':
+        """Wrap already sorted, disjoint and coalesced ordinal arrays without copying them"""
+        new = cls.__new__(cls)
+        new._starts = starts
+        new._ends = ends
+        new._cumdays = None
+        new._bitmap = None
         return new
 
-    def copy(self) -> 'DateRange':
-        new: DateRange = type(self)(None, None)
-        new._intervals = [interval.copy() for interval in self]
+    @classmethod
+    def _from_bitmap(cls, bitmap: Tuple[int, int]) -> 'DateRange':
+        """Wrap the result of a bitmap operation, the interval arrays are built when first read"""
+        new = cls._from_ordinals(None, None)
+        del new._starts, new._ends
+        new._bitmap = bitmap
         return new
 
+    def __getattr__(self, name: str):
+        # Only called for unset slots. The interval arrays of a DateRange holding just a
+        # bitmap are built from it the first time anything reads them.
+        if name in ('_starts', '_ends'):
+            self._starts, self._ends = _from_bitmap(*self._bitmap)
+            return getattr(self, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def _fragmented(self) -> bool:
+        """If set operations are better done on bitmaps, see _BITMAP_DAYS_PER_INTERVAL"""
+        if self._bitmap is not None:
+            return True
+        if np is None:
+            return False
+        count = len(self._starts)
+        return count >= _BITMAP_MIN_INTERVALS and self._ends[-1] - self._starts[0] < count * _BITMAP_DAYS_PER_INTERVAL
+
+    def _extent(self) -> Tuple[int, int, int]:
+        """The first and last day and the number of intervals, counted on the bitmap when the arrays are not built"""
+        try:
+            starts, ends = object.__getattribute__(self, '_starts'), self._ends
+        except AttributeError:
+            lower, bits = self._bitmap
+            # A run of days starts at every set bit whose lower neighbour is not set
+            return lower, lower + bits.bit_length() - 1, _popcount(bits & ~(bits << 1))
+        return (starts[0], ends[-1], len(starts)) if starts else (0, -1, 0)
+
+    def _use_bitmaps(self, other: 'DateRange') -> bool:
+        """If a set operation with other is better done on bitmaps, see _BITMAP_DAYS_PER_INTERVAL"""
+        if not (self._fragmented() and other._fragmented()):
+            return False
+        first_1, last_1, count_1 = self._extent()
+        first_2, last_2, count_2 = other._extent()
+        if not count_1 or not count_2:
+            return True
+        return max(last_1, last_2) - min(first_1, first_2) < (count_1 + count_2) * _BITMAP_DAYS_PER_INTERVAL
+
+    def _get_bitmap(self) -> Tuple[int, int]:
+        """The bitmap of the days, built on first use and dropped whenever the intervals change"""
+        if self._bitmap is None:
+            self._bitmap = _to_bitmap(self._starts, self._ends)
+        return self._bitmap
+
+    @classmethod
+    def _from_views(cls, starts: Union[array, memoryview], ends: Union[array, memoryview]) -> 'DateRange':
+        """Copy ordinals from views of a buffer that the DateRange does not own"""
+        return cls._from_ordinals(_copy_ordinals(starts), _copy_ordinals(ends))
+
+    def __reduce_ex__(self, protocol: int):
+        """
+        Pickle the ordinal arrays as two buffers instead of the default slot state. With
+        protocol 5 they are PickleBuffers that can be passed out-of-band without a copy.
+        """
+        starts, ends = _little_endian(self._starts), _little_endian(self._ends)
+        if protocol >= 5:
+            return _unpickle, (type(self), PickleBuffer(starts), PickleBuffer(ends))
+        return _unpickle, (type(self), starts.tobytes(), ends.tobytes())
+
+    @classmethod
+    def from_list(cls, ranges: Iterable[Union['DateRange', 'DateRange.Interval', date,
+                                              Tuple[Optional[date], Optional[date]]]]) -> 'DateRange':
+        """
+        Create a DateRange from any mix of dates, Intervals, DateRanges and (start, end)
+        tuples, the tuples following the same rules as DateRange(start, end).
+        All intervals are sorted once and then coalesced in a single sweep.
+        >>> print(DateRange.from_list([date(2021, 8, 2), (date(2021, 7, 1), date(2021, 8, 1)), date(2021, 9, 1)]))
+        from 2021-07-01 to 2021-08-02 and
+        from 2021-09-01 to 2021-09-01
+        """
+        intervals = []
+        for item in ranges:
+            if isinstance(item, date):
+                day = item.toordinal()
+                intervals.append((day, day))
+            else:
+                intervals.extend(cls._item_intervals(item))
+        intervals.sort()
+        return cls._from_ordinals(*_coalesce(intervals))
+
+    @classmethod
+    def _item_intervals(cls, item: Union['DateRange', 'DateRange.Interval', date,
+                                          Tuple[Optional[date], Optional[date]]]) -> Iterable[Tuple[int, int]]:
+        """The (start, end) ordinals of any of the items from_list accepts"""
+        if isinstance(item, DateRange):
+            return zip(item._starts, item._ends)
+        if isinstance(item, date):
+            day = item.toordinal()
+            return (day, day),
+        if isinstance(item, cls.Interval):
+            return item.ordinals(),
+        if isinstance(item, tuple):
+            return cls._init_intervals(*item)
+        raise TypeError(f'Cannot create range from type: {type(item)}')
+
+    @classmethod
+    def union_all(cls, ranges: Iterable[Union['DateRange', date]]) -> 'DateRange':
+        """
+        Return the union of any number of DateRanges (or dates) with a single k-way
+        merge of their intervals instead of chaining the | operator.
+        >>> print(DateRange.union_all([DateRange(date(2021, 8, 1), date(2021, 8, 31)), date(2021, 7, 31)]))
+        from 2021-07-31 to 2021-08-31
+        """
+        ranges = [cls._coerce(item) for item in ranges]
+        return cls._from_ordinals(*_coalesce(cls._sorted_interval_iter(*ranges)))
+
+    @classmethod
+    def intersect_all(cls, ranges: Iterable[Union['DateRange', date]]) -> 'DateRange':
+        """
+        Return the days within every one of the DateRanges (or dates) using one sweep
+        over all of their intervals. The intersection of no ranges is all of time.
+        """
+        ranges = [cls._coerce(item) for item in ranges]
+        if not ranges:
+            return cls.all_time()
+        return cls.coverage_at_least(ranges, len(ranges))
+
+    @classmethod
+    def coverage_at_least(cls, ranges: Iterable[Union['DateRange', date]], k: int) -> 'DateRange':
+        """
+        Return the days within at least k of the DateRanges (or dates), e.g. the days when
+        at least 3 of 10 people are available, using one sweep over all of their intervals.
+        >>> people = [DateRange(date(2021, 8, 1), date(2021, 8, 10)), DateRange(date(2021, 8, 5), date(2021, 8, 20)),
+        ...           DateRange(date(2021, 8, 8), date(2021, 8, 31))]
+        >>> print(DateRange.coverage_at_least(people, 2))
+        from 2021-08-05 to 2021-08-20
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1: {k}")
+        ranges = [cls._coerce(item) for item in ranges]
+        return cls._from_ordinals(*_coalesce((start, end) for start, end, depth in _depth_segments(ranges)
+                                             if depth >= k))
+
+    @classmethod
+    def depth_profile(cls, ranges: Iterable[Union['DateRange', date]]) -> Iterator[Tuple[Interval, int]]:
+        """
+        Yield (Interval, count) for each stretch of days covered by the same number of the
+        DateRanges (or dates). Days covered by none of them are skipped.
+        """
+        ranges = [cls._coerce(item) for item in ranges]
+        from_ordinals = cls.Interval.from_ordinals
+        for start, end, depth in _depth_segments(ranges):
+            yield from_ordinals(start, end), depth
+
+    @classmethod
+    def _coerce(cls, item: Union['DateRange', date]) -> 'DateRange':
+        if isinstance(item, DateRange):
+            return item
+        if isinstance(item, date):
+            return cls(item, item)
+        raise TypeError(f'Cannot create range from type: {type(item)}')
+
+    def copy(self) -> 'DateRange':
+        if self._bitmap is not None:
+            return self._from_bitmap(self._bitmap)
+        return self._from_ordinals(_copy_ordinals(self._starts), _copy_ordinals(self._ends))
+
+    def freeze(self) -> 'FrozenDateRange':
+        """Return an immutable and hashable copy of the DateRange"""
+        return FrozenDateRange._from_ordinals(_copy_ordinals(self._starts), _copy_ordinals(self._ends))
+
     @property
     def days(self) -> int:
         """Return the number of days in the DateRange (inclusive)"""
-        return sum(interval.days for interval in self)
+        if self._bitmap is not None:
+            return _popcount(self._bitmap[1])
+        if self._cumdays is not None:
+            return self._cumdays[-1]
+        return sum(self._ends) - sum(self._starts) + len(self._starts)
 
     @property
     def intervals(self) -> List[Interval]:
-        """List of date intervals within the DateRange"""
-        return self._intervals
+        """List of date intervals within the DateRange (built from the stored ordinals on each access)"""
+        return list(self)
 
     @property
     def earliest(self) -> date:
         """The earliest day in the DateRange"""
-        return self.intervals[0].start if self.intervals else None
+        if self._bitmap is not None:
+            return date.fromordinal(self._bitmap[0]) if self._bitmap[1] else None
+        return date.fromordinal(self._starts[0]) if self._starts else None
 
     @property
     def latest(self) -> date:
         """The latests day in the DateRange"""
-        return self.intervals[-1].end if self.intervals else None
+        if self._bitmap is not None:
+            lower, bits = self._bitmap
+            return date.fromordinal(lower + bits.bit_length() - 1) if bits else None
+        return date.fromordinal(self._ends[-1]) if self._ends else None
 
     @classmethod
     def all_time(cls):
         return cls(date.min, date.max)
 
-    def __iter__(self):
+    def __iter__(self) -> Iterator[Interval]:
         """Iterate over the intervals"""
-        for interval in self.intervals:
-            yield interval
+        from_ordinals = self.Interval.from_ordinals
+        for start, end in zip(self._starts, self._ends):
+            yield from_ordinals(start, end)
 
     def __len__(self):
         """Return the number of intervals"""
-        return len(self.intervals)
+        return len(self._starts)
+
+    def __bool__(self):
+        """If the DateRange has any days"""
+        if self._bitmap is not None:
+            return bool(self._bitmap[1])
+        return bool(self._starts)
 
     @type_check
     def __eq__(self, other: Union[date, 'DateRange']):
-        if len(self) != len(other):
-            return False
-        return all(interval[0] == interval[1] for interval in zip(self, other))
+        if self._bitmap is not None and other._bitmap is not None:
+            return self._bitmap == other._bitmap
+        return self._starts == other._starts and self._ends == other._ends
 
     @type_check
     def __gt__(self, other):
         """All time intervals are entirely after all of another date range's time intervals"""
-        return self.earliest > other.latest if self.earliest and other.latest else None
+        return self._starts[0] > other._ends[-1] if self._starts and other._ends else None
 
     @type_check
     def __lt__(self, other):
         """All time intervals are entirely before all of another date range's time intervals"""
-        return self.latest < other.earliest if self.latest and other.earliest else None
+        return self._ends[-1] < other._starts[0] if self._ends and other._starts else None
 
     def __contains__(self, other: Union[date, 'DateRange']):
         """If another DateRange (or date) is entirely within this DateRange (inclusive of end date)"""
         if not isinstance(other, DateRange):
             if isinstance(other, date):
-                return any(other in _range for _range in self)
+                day = other.toordinal()
+                if self._bitmap is not None and self._bitmap[1].bit_length() <= _BITMAP_TEST_BITS:
+                    lower, bits = self._bitmap
+                    return day >= lower and bool(bits >> (day - lower) & 1)
+                index = bisect_right(self._starts, day) - 1
+                return index >= 0 and day <= self._ends[index]
+            if isinstance(other, RecurringDateRange):
+                return not other - self
             return NotImplemented
-        queries = iter(other.intervals)
-        intervals = iter(self.intervals)
+        starts, ends = self._starts, self._ends
+        # The intervals are sorted and disjoint so every query can only be within the
+        # last interval starting on or before it. Queries are sorted too, so the search
+        # resumes from the previous hit and gallops forward.
+        index = 0
+        for query_start, query_end in zip(other._starts, other._ends):
+            index = _gallop_right(starts, query_start, index) - 1
+            if index < 0 or ends[index] < query_end:
+                return False
+        return True
+
+    def contains_many(self, dates) -> Union['np.ndarray', List[bool]]:
+        """
+        Check many dates at once, returning a mask of the dates within the DateRange.
+        Takes a numpy datetime64 array, a pandas column or any iterable of dates.
+        With numpy installed all of them are looked up with one vectorized binary
+        search and a boolean array is returned, otherwise a list of bools.
+        """
+        indexes = self.locate_many(dates)
+        if np is None:
+            return [index >= 0 for index in indexes]
+        return indexes >= 0
+
+    def locate_many(self, dates) -> Union['np.ndarray', List[int]]:
+        """
+        Like contains_many but returns the index of the interval containing each date,
+        or -1 for dates that are not within the DateRange.
+        """
+        if np is None:
+            starts, ends = self._starts, self._ends
+            indexes = []
+            for day in dates:
+                day = day.toordinal()
+                index = bisect_right(starts, day) - 1
+                indexes.append(index if index >= 0 and day <= ends[index] else -1)
+            return indexes
+
+        days = _ordinal_array(dates)
+        if not self._starts:
+            return np.full(days.shape, -1, dtype=np.intp)
+        starts = np.frombuffer(self._starts, dtype=np.intc)
+        ends = np.frombuffer(self._ends, dtype=np.intc)
+        indexes = np.searchsorted(starts, days, side='right') - 1
+        # An index of -1 picks the last end here but is then masked out
+        found = (indexes >= 0) & (days <= ends[indexes])
+        return np.where(found, indexes, -1)
+
+    def _days_before_index(self) -> array:
+        """
+        The number of days in the intervals before each interval, and in all of them at the end.
+        Built on first use and dropped whenever the intervals change.
+        """
+        if self._cumdays is None:
+            self._cumdays = array('q', accumulate((end - start + 1 for start, end in zip(self._starts, self._ends)),
+                                                  initial=0))
+        return self._cumdays
+
+    def _days_before(self, day: int) -> int:
+        """The number of days in the DateRange before an ordinal"""
+        cumdays = self._days_before_index()
+        index = bisect_left(self._ends, day)
+        if index < len(self._starts) and self._starts[index] < day:
+            return cumdays[index] + day - self._starts[index]
+        return cumdays[index]
+
+    def rank(self, day: date) -> int:
+        """
+        Return the number of days in the DateRange before a date, which is the position of
+        the date among the days of the DateRange if it is in it
+        >>> DateRange(date(2021, 8, 1), date(2021, 8, 31)).rank(date(2021, 8, 10))
+        9
+        """
+        return self._days_before(day.toordinal())
+
+    def count_days(self, start: date, end: date) -> int:
+        """
+        Return the number of days in the DateRange from start to end (inclusive)
+        >>> my_range = DateRange(date(2021, 8, 1), date(2021, 8, 10)) + date(2021, 8, 20)
+        >>> my_range.count_days(date(2021, 8, 5), date(2021, 8, 31))
+        7
+        """
+        if start > end:
+            raise ValueError(f"End cannot be before start: {start} > {end}")
+        return self._days_before(end.toordinal() + 1) - self._days_before(start.toordinal())
+
+    def nth_day(self, n: int) -> date:
+        """
+        Return the nth day of the DateRange, counting from 0, or from the end if n is negative
+        >>> (DateRange(date(2021, 8, 1), date(2021, 8, 10)) + date(2021, 8, 20)).nth_day(10)
+        datetime.date(2021, 8, 20)
+        """
+        cumdays = self._days_before_index()
+        if n < 0:
+            n += cumdays[-1]
+        if not 0 <= n < cumdays[-1]:
+            raise IndexError("DateRange day index out of range")
+        index = bisect_right(cumdays, n) - 1
+        return date.fromordinal(self._starts[index] + n - cumdays[index])
+
+    def next_day(self, day: date) -> Optional[date]:
+        """
+        Return the first day of the DateRange on or after a date, or None if there is none
+        >>> DateRange(date(2021, 8, 10), date(2021, 8, 20)).next_day(date(2021, 8, 1))
+        datetime.date(2021, 8, 10)
+        """
+        day = day.toordinal()
+        index = bisect_left(self._ends, day)
+        if index == len(self._ends):
+            return None
+        return date.fromordinal(max(day, self._starts[index]))
+
+    def prev_day(self, day: date) -> Optional[date]:
+        """
+        Return the last day of the DateRange on or before a date, or None if there is none
+        >>> DateRange(date(2021, 8, 10), date(2021, 8, 20)).prev_day(date(2021, 8, 31))
+        datetime.date(2021, 8, 20)
+        """
+        day = day.toordinal()
+        index = bisect_right(self._starts, day) - 1
+        if index < 0:
+            return None
+        return date.fromordinal(min(day, self._ends[index]))
+
+    def gaps(self, min_length: int = 1) -> Iterator[Interval]:
+        """
+        Yield the gaps between the intervals of the DateRange that are at least min_length days long
+        >>> list((DateRange(date(2021, 8, 1), date(2021, 8, 9)) + date(2021, 8, 20) + date(2021, 8, 22)).gaps(2))
+        [Interval(2021-08-10, 2021-08-19)]
+        """
+        from_ordinals = self.Interval.from_ordinals
+        for end, start in zip(self._ends, islice(self._starts, 1, None)):
+            if start - end > min_length:
+                yield from_ordinals(end + 1, start - 1)
+
+    def find_gap(self, after: date, length: int) -> Optional[Interval]:
+        """
+        Return the first run of at least length days on or after a date that are not in the
+        DateRange, starting from that date if it is not in the DateRange itself. The run
+        after the last interval reaches the end of time, None is only returned if the
+        DateRange covers every long enough run until then.
+        >>> (DateRange(date(2021, 8, 1), date(2021, 8, 9)) + date(2021, 8, 20)).find_gap(date(2021, 8, 5), 14)
+        Interval(2021-08-21, 9999-12-31)
+        """
+        if length < 1:
+            raise ValueError(f"Gap length must be at least 1, not {length}")
+        day = after.toordinal()
+        starts, ends = self._starts, self._ends
+        # Only the intervals from the first one ending on or after the date on are streamed
+        intervals = ((starts[index], ends[index]) for index in range(bisect_left(ends, day), len(ends)))
+        for start, end in _complement(intervals, lower=day):
+            if end - start >= length - 1:
+                return self.Interval.from_ordinals(start, end)
+        return None
+
+    def iter_days(self, step: int = 1, weekdays: Optional[Iterable[int]] = None) -> Iterator[date]:
+        """
+        Lazily yield every covered day in order, so even all of time can be walked through.
+        weekdays limits the days to those weekdays (Monday is 0 like date.weekday) and step
+        then only yields every step-th of the remaining days.
+        >>> [str(day) for day in DateRange(date(2021, 8, 1), date(2021, 8, 31)).iter_days(step=2, weekdays=[0])]
+        ['2021-08-02', '2021-08-16', '2021-08-30']
+        """
+        if step < 1:
+            raise ValueError(f"step must be at least 1: {step}")
+        from_ordinal = date.fromordinal
+        if weekdays is None:
+            position = 0
+            for start, end in zip(self._starts, self._ends):
+                # Carry on counting from the previous interval
+                for day in range(start + (-position) % step, end + 1, step):
+                    yield from_ordinal(day)
+                position += end - start + 1
+            return
 
-        total_hits = 0
+        # Ordinal 1 is a Monday
+        weekdays = frozenset((weekday + 1) % 7 for weekday in weekdays)
+        position = 0
+        for start, end in zip(self._starts, self._ends):
+            for day in range(start, end + 1):
+                if day % 7 in weekdays:
+                    if not position % step:
+                        yield from_ordinal(day)
+                    position += 1
+
+    def to_ordinals(self) -> Union['np.ndarray', array]:
+        """
+        Return the ordinal (see date.toordinal) of every covered day. With numpy an int64 array
+        is built without creating a date or int object per day, otherwise an array('i').
+        """
+        if np is None:
+            days = array(_TYPECODE)
+            for start, end in zip(self._starts, self._ends):
+                days.extend(range(start, end + 1))
+            return days
+
+        if not self._starts:
+            return np.empty(0, dtype=np.int64)
+        starts = np.frombuffer(self._starts, dtype=np.intc).astype(np.int64)
+        lengths = np.frombuffer(self._ends, dtype=np.intc) - starts + 1
+        # Each day is its position in the output plus an offset that is the same for the whole interval
+        offsets = starts - (np.cumsum(lengths) - lengths)
+        return np.arange(lengths.sum(), dtype=np.int64) + np.repeat(offsets, lengths)
+
+    def to_datetime64(self) -> 'np.ndarray':
+        """Return every covered day as a numpy datetime64[D] array, numpy is required"""
+        _require_numpy("to_datetime64")
+        days = self.to_ordinals()
+        days -= _EPOCH
+        return days.view('datetime64[D]')
+
+    def to_bytes(self) -> bytes:
+        """
+        Encode the DateRange in the compact binary format, see from_bytes
+        >>> print(DateRange.from_bytes(DateRange(date(2021, 8, 1), date(2021, 8, 31)).to_bytes()))
+        from 2021-08-01 to 2021-08-31
+        """
+        return b''.join((_HEADER.pack(_MAGIC, _VERSION, _KIND_RANGE, len(self._starts)),
+                         _little_endian(self._starts).tobytes(), _little_endian(self._ends).tobytes()))
 
-        interval = next(intervals, None)
-        query = next(queries, None)
-        while interval and query:
-            # Since queries should always be smaller or equal if true, they are advanced first
-            if query < interval:
-                query = next(queries, None)
-                continue
-            if query in interval:
-                total_hits += 1
-                query = next(queries, None)
-                continue
-            if interval < query:
-                interval = next(intervals, None)
-                continue
-            # This accounts for queries that overlap intervals, and queries that are larger than the interval
-            return False
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'DateRange':
+        """Decode a DateRange encoded with to_bytes, raises ValueError for anything else"""
+        buffer = memoryview(data).cast('B')
+        count = _read_header(buffer, _KIND_RANGE)
+        size = count * array(_TYPECODE).itemsize
+        if len(buffer) != _HEADER.size + 2 * size:
+            raise ValueError("Data does not match the number of intervals in its header")
+        return cls._from_ordinals(_copy_ordinals(_view(buffer, _HEADER.size, count, _TYPECODE)),
+                                  _copy_ordinals(_view(buffer, _HEADER.size + size, count, _TYPECODE)))
+
+    def _set_ordinals(self, starts: array, ends: array) -> 'DateRange':
+        """Replace the intervals in place, for the in-place operators"""
+        self._starts, self._ends = starts, ends
+        self._cumdays = self._bitmap = None
+        return self
 
-        return total_hits == len(other.intervals)
+    def _set_bitmap(self, bitmap: Tuple[int, int]) -> 'DateRange':
+        """Replace the days in place with the result of a bitmap operation"""
+        self._starts = self._ends = None
+        del self._starts, self._ends
+        self._cumdays = None
+        self._bitmap = bitmap
+        return self
+
+    def _operation(self, other: 'DateRange', bitmap_operation: Callable[[int, int], int],
+                   interval_operation: Callable[['DateRange'], Tuple[array, array]]) -> 'DateRange':
+        """
+        A new DateRange from a set operation, done on bitmaps if both operands are fragmented
+        or already hold a bitmap and together span few enough days, on the interval arrays otherwise
+        """
+        if self._use_bitmaps(other):
+            return self._from_bitmap(_bitmap_operation(bitmap_operation, self._get_bitmap(), other._get_bitmap()))
+        return self._from_ordinals(*interval_operation(other))
+
+    def _operation_in_place(self, other: 'DateRange', bitmap_operation: Callable[[int, int], int],
+                            interval_operation: Callable[['DateRange'], Tuple[array, array]]) -> 'DateRange':
+        """The same as _operation but replacing the days of the DateRange"""
+        if self._use_bitmaps(other):
+            return self._set_bitmap(_bitmap_operation(bitmap_operation, self._get_bitmap(), other._get_bitmap()))
+        return self._set_ordinals(*interval_operation(other))
+
+    def _splice(self, lo: int, hi: int, starts: Tuple[int, ...], ends: Tuple[int, ...]):
+        """Replace intervals lo to hi in place, for the single interval changes"""
+        if hi - lo == len(starts) == 1:
+            self._starts[lo] = starts[0]
+            self._ends[lo] = ends[0]
+        else:
+            self._starts[lo:hi] = array(_TYPECODE, starts)
+            self._ends[lo:hi] = array(_TYPECODE, ends)
+        self._cumdays = self._bitmap = None
+
+    def _add(self, start: int, end: int):
+        # Intervals ending the day before start or later, and starting the day after end
+        # or earlier, overlap or butt the new one and are all replaced by their union
+        lo = bisect_left(self._ends, start - 1)
+        hi = bisect_right(self._starts, end + 1, lo)
+        if lo < hi:
+            if hi - lo == 1 and self._starts[lo] <= start and end <= self._ends[lo]:
+                return
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._splice(lo, hi, (start,), (end,))
+
+    def _remove(self, start: int, end: int):
+        # Intervals overlapping the removed one are replaced by the parts sticking out of it
+        lo = bisect_left(self._ends, start)
+        hi = bisect_right(self._starts, end, lo)
+        if lo == hi:
+            return
+        starts, ends = [], []
+        if self._starts[lo] < start:
+            starts.append(self._starts[lo])
+            ends.append(start - 1)
+        if self._ends[hi - 1] > end:
+            starts.append(end + 1)
+            ends.append(self._ends[hi - 1])
+        self._splice(lo, hi, starts, ends)
+
+    def add_day(self, day: date):
+        """
+        Add a single day in place. The intervals are found by binary search and only
+        the ones touching the day change, joining any interval it butts against.
+        >>> my_range = DateRange(date(2021, 8, 1), date(2021, 8, 30))
+        >>> my_range.add_day(date(2021, 8, 31))
+        >>> print(my_range)
+        from 2021-08-01 to 2021-08-31
+        """
+        self.add_interval(day, day)
+
+    def remove_day(self, day: date):
+        """
+        Remove a single day in place, splitting the interval containing it if needed
+        >>> my_range = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        >>> my_range.remove_day(date(2021, 8, 15))
+        >>> print(my_range)
+        from 2021-08-01 to 2021-08-14 and
+        from 2021-08-16 to 2021-08-31
+        """
+        self.remove_interval(day, day)
+
+    def add_interval(self, start: date, end: date):
+        """Add all days from start to end (inclusive) in place, like add_day"""
+        if not isinstance(start, date) or not isinstance(end, date):
+            raise TypeError(f'Cannot add interval from types: {type(start)}, {type(end)}')
+        if start > end:
+            raise ValueError(f"End cannot be before start: {start} > {end}")
+        self._add(start.toordinal(), end.toordinal())
+
+    def remove_interval(self, start: date, end: date):
+        """Remove all days from start to end (inclusive) in place, like remove_day"""
+        if not isinstance(start, date) or not isinstance(end, date):
+            raise TypeError(f'Cannot remove interval from types: {type(start)}, {type(end)}')
+        if start > end:
+            raise ValueError(f"End cannot be before start: {start} > {end}")
+        self._remove(start.toordinal(), end.toordinal())
+
+    # The set operations only read the ordinals of both operands and build the result
+    # arrays in one pass. The binary operators wrap the result in a new DateRange and the
+    # in-place operators swap it in, so neither copies an operand first.
+    # Between fragmented DateRanges they are done on bitmaps instead, see _operation.
+
+    def _intersect(self, other: 'DateRange') -> Tuple[array, array]:
+        intervals = self._sorted_interval_iter(self, other)
+        starts = array(_TYPECODE)
+        ends = array(_TYPECODE)
+
+        _, end = next(intervals, (None, None))
+        for next_start, next_end in intervals:
+            # Sorted by start, so only the ends decide the overlap
+            if next_start <= end:
+                starts.append(next_start)
+                ends.append(next_end if next_end <= end else end)
+            if next_end > end:
+                end = next_end
+        return starts, ends
 
     def _interval_intersect(self, other: 'DateRange') -> 'DateRange':
-        if not isinstance(other, DateRange):
-            if isinstance(other, date):
-                if other in self:
-                    return type(self)(other, other)
-                self._intervals = []
-                return self
-            return NotImplemented
-        intervals = self._sorted_interval_iter(self.intervals, other.intervals)
-        new_intervals = []
-
-        interval = next(intervals, None)
-        next_interval = next(intervals, None)
-        while interval and next_interval:
-            intersection = interval & next_interval
-            if intersection:
-                new_intervals.append(intersection.copy())
-            if next_interval.end > interval.end:
-                interval = next_interval
-            next_interval = next(intervals, None)
-
-        self._intervals = new_intervals
-        return self
+        return self._operation_in_place(other, and_, self._intersect)
 
+    @type_check
     def __and__(self, other: Union[date, 'DateRange']) -> 'DateRange':
         """Return the intersection of date ranges or an empty DateRange if they do not intersect"""
-        return self.copy()._interval_intersect(other)
+        return self._operation(other, and_, self._intersect)
 
     __rand__ = __and__
 
+    @type_check
     def __iand__(self, other: Union[date, 'DateRange']) -> 'DateRange':
         return self._interval_intersect(other)
 
-    def _interval_union(self, other: 'DateRange') -> 'DateRange':
-        intervals = self._sorted_interval_iter(self.intervals, other.intervals)
-        new_intervals = []
-
-        interval = next(intervals, None)
-        next_interval = next(intervals, None)
-        while interval and next_interval:
-            if interval < next_interval and not interval.r_butted(next_interval):
-                new_intervals.append(interval.copy())
-                interval = next_interval
-                next_interval = next(intervals, None)
-                continue
-
-            if next_interval.end > interval.end:
-                interval.end = next_interval.end
-            next_interval = next(intervals, None)
+    def _union(self, other: 'DateRange') -> Tuple[array, array]:
+        return _coalesce(self._sorted_interval_iter(self, other))
 
-        self._intervals = new_intervals + [interval] if interval else []
-        return self
+    def _interval_union(self, other: 'DateRange') -> 'DateRange':
+        return self._operation_in_place(other, or_, self._union)
 
     @type_check
     def __or__(self, other: Union[date, 'DateRange']) -> 'DateRange':
         """Return the Union of date ranges"""
-        return self.copy()._interval_union(other)
+        return self._operation(other, or_, self._union)
 
     __ror__ = __or__
     __add__ = __or__
     __radd__ = __or__
 
-    @type_check
     def __ior__(self, other: Union[date, 'DateRange']) -> 'DateRange':
-        return self._interval_union(other)
+        # A day or a single interval is spliced in place instead of merging every interval
+        if isinstance(other, date):
+            day = other.toordinal()
+            self._add(day, day)
+        elif isinstance(other, DateRange) and len(other) == 1:
+            self._add(other._starts[0], other._ends[0])
+        elif isinstance(other, DateRange):
+            self._interval_union(other)
+        else:
+            return NotImplemented
+        return self
 
     __iadd__ = __ior__
 
-    def _interval_subtract(self, other: 'DateRange') -> 'DateRange':
-        # TODO: would it be easier to invert the subtrahend and intersect them?
-        intervals = iter(self.intervals)
-        subtrahends = iter(other.intervals)
-        new_intervals = []
-        temp_intervals = []
-
-        interval = next(intervals, None)
-        subtrahend = next(subtrahends, None)
-        while interval and subtrahend:
-            if subtrahend < interval:
-                subtrahend = next(subtrahends, None)
-                if subtrahend is None:
-                    new_intervals.append(interval)
-                continue
-            if interval < subtrahend:
-                new_intervals.append(interval)
-                interval = next(intervals, None)
-                continue
-
-            # The subtrahend must be overlapping the interval at this point so we subtract
-            temp_intervals += interval - subtrahend
+    def _subtract(self, other: 'DateRange') -> Tuple[array, array]:
+        # Subtracting is intersecting with the complement of the subtrahend. The gaps of the
+        # complement are read straight from the subtrahend's arrays, gap k runs from the day
+        # after subtrahend k - 1 ends to the day before subtrahend k starts, so it is never built.
+        sub_starts, sub_ends = other._starts, other._ends
+        sub_count = len(sub_starts)
+        starts = array(_TYPECODE)
+        ends = array(_TYPECODE)
+
+        j = 0
+        for start, end in zip(self._starts, self._ends):
+            # Subtrahends entirely before this interval can not touch any later interval either
+            while j < sub_count and sub_ends[j] < start:
+                j += 1
+            k = j
+            # Each subtrahend overlapping the interval closes the gap before it
+            while k < sub_count and sub_starts[k] <= end:
+                if sub_starts[k] > start:
+                    starts.append(start)
+                    ends.append(sub_starts[k] - 1)
+                start = sub_ends[k] + 1
+                if start > end:
+                    break
+                k += 1
+            if start <= end:
+                starts.append(start)
+                ends.append(end)
+        return starts, ends
 
-            # If a portion of the interval extends past the subtrahend
-            if subtrahend.end < interval.end:
-                subtrahend = next(subtrahends, None)
-                if subtrahend is not None:
-                    interval = temp_intervals.pop()
-            else:
-                interval = next(intervals, None)
-                new_intervals += temp_intervals
-                temp_intervals.clear()
-        self._intervals = new_intervals + temp_intervals + list(intervals)
-        return self
+    def _interval_subtract(self, other: 'DateRange') -> 'DateRange':
+        return self._operation_in_place(other, _and_not, self._subtract)
 
     @type_check
     def __sub__(self, other: Union[date, 'DateRange']) -> 'DateRange':
-        return self.copy()._interval_subtract(other)
+        return self._operation(other, _and_not, self._subtract)
 
     @type_check
     def __rsub__(self, other: Union[date, 'DateRange']) -> 'DateRange':
         # ORDER IS IMPORTANT HERE
-        return other._interval_subtract(self)
+        return other._operation(self, _and_not, other._subtract)
 
-    @type_check
     def __isub__(self, other: Union[date, 'DateRange']) -> 'DateRange':
-        return self._interval_subtract(other)
+        if isinstance(other, date):
+            day = other.toordinal()
+            self._remove(day, day)
+        elif isinstance(other, DateRange) and len(other) == 1:
+            self._remove(other._starts[0], other._ends[0])
+        elif isinstance(other, DateRange):
+            self._interval_subtract(other)
+        else:
+            return NotImplemented
+        return self
+
+    def _xor(self, other: 'DateRange') -> Tuple[array, array]:
+        return _coalesce(_exclusive(self._sorted_interval_iter(self, other)))
+
+    def _interval_xor(self, other: 'DateRange') -> 'DateRange':
+        return self._operation_in_place(other, xor, self._xor)
+
+    @type_check
+    def __xor__(self, other: Union[date, 'DateRange']) -> 'DateRange':
+        """Return the days within exactly one of the date ranges"""
+        return self._operation(other, xor, self._xor)
+
+    __rxor__ = __xor__
+
+    @type_check
+    def __ixor__(self, other: Union[date, 'DateRange']) -> 'DateRange':
+        return self._interval_xor(other)
+
+    def symmetric_difference(self, other: Union[date, 'DateRange']) -> 'DateRange':
+        """
+        Return the days within exactly one of the date ranges, found in a single pass over both.
+        >>> yesterday = DateRange(date(2021, 8, 1), date(2021, 8, 20))
+        >>> today = DateRange(date(2021, 8, 10), date(2021, 8, 31))
+        >>> print(yesterday.symmetric_difference(today))
+        from 2021-08-01 to 2021-08-09 and
+        from 2021-08-21 to 2021-08-31
+        """
+        return self ^ other
+
+    def _shared_days(self, other: 'DateRange', first: bool = False) -> int:
+        """
+        Count the days shared with another DateRange in one walk over both without building
+        the intersection, or return 1 as soon as one is found if first is set.
+        The side with fewer intervals drives the walk. When the other side has many more
+        intervals it is galloped through to skip straight to the ones that can overlap.
+        """
+        if self._bitmap is not None and other._bitmap is not None:
+            return _popcount(_bitmap_operation(and_, self._bitmap, other._bitmap)[1])
+        if len(self._starts) > len(other._starts):
+            self, other = other, self
+        starts, ends = other._starts, other._ends
+        count = len(starts)
+        if not count:
+            return 0
+        gallop = count > 8 * len(self._starts)
+        total = 0
+        index = 0
+        for start, end in zip(self._starts, self._ends):
+            # Move to the first interval ending on or after the start, the ones before
+            # can not overlap later intervals either
+            if ends[index] < start:
+                if gallop:
+                    index = _gallop_right(ends, start - 1, index)
+                else:
+                    index += 1
+                    while index < count and ends[index] < start:
+                        index += 1
+                if index == count:
+                    break
+            other_start = starts[index]
+            if other_start > end:
+                continue
+            if first:
+                return 1
+            other_end = ends[index]
+            total += (end if end < other_end else other_end) - (start if start > other_start else other_start) + 1
+            # Only the first overlapping interval can start before the start
+            position = index + 1
+            while position < count and starts[position] <= end:
+                other_end = ends[position]
+                total += (end if end < other_end else other_end) - starts[position] + 1
+                position += 1
+        return total
+
+    def overlaps(self, other: Union[date, 'DateRange']) -> bool:
+        """
+        If the DateRanges share at least one day, stopping at the first shared day
+        >>> DateRange(date(2021, 8, 1), date(2021, 8, 31)).overlaps(DateRange(date(2021, 8, 31), date(2021, 9, 30)))
+        True
+        """
+        return bool(self._shared_days(self._coerce(other), first=True))
+
+    def isdisjoint(self, other: Union[date, 'DateRange']) -> bool:
+        """If the DateRanges share no days, like set.isdisjoint"""
+        return not self.overlaps(other)
+
+    def overlap_days(self, other: Union[date, 'DateRange']) -> int:
+        """
+        Return the number of days shared with another DateRange, the same as (self & other).days
+        >>> DateRange(date(2021, 8, 1), date(2021, 8, 31)).overlap_days(DateRange(date(2021, 8, 25), date(2021, 9, 30)))
+        7
+        """
+        return self._shared_days(self._coerce(other))
+
+    def jaccard(self, other: Union[date, 'DateRange']) -> float:
+        """
+        Return the number of shared days divided by the number of days in either DateRange,
+        1.0 for two empty DateRanges
+        >>> DateRange(date(2021, 8, 1), date(2021, 8, 20)).jaccard(DateRange(date(2021, 8, 11), date(2021, 8, 30)))
+        0.3333333333333333
+        """
+        other = self._coerce(other)
+        shared = self.overlap_days(other)
+        either = self.days + other.days - shared
+        return shared / either if either else 1.0
+
+    def lazy(self) -> 'LazyDateRange':
+        """Start a lazily evaluated expression with this DateRange, see LazyDateRange"""
+        return LazyDateRange('range', (self,))
+
+    def complement(self, within: Optional[Union['DateRange', date]] = None) -> 'DateRange':
+        """
+        Return the days that are not within this DateRange, either for all of time or only
+        those within another DateRange. Found in a single pass over both.
+        >>> print(DateRange(date(2021, 8, 10), date(2021, 8, 20)).complement(DateRange(date(2021, 8, 1), date(2021, 8, 31))))
+        from 2021-08-01 to 2021-08-09 and
+        from 2021-08-21 to 2021-08-31
+        """
+        if within is None:
+            return self._from_ordinals(*_pack(_complement(zip(self._starts, self._ends))))
+        within = self._coerce(within)
+        return self._from_ordinals(*within._subtract(self))
+
+    def __invert__(self) -> 'DateRange':
+        """Return every day of all time that is not within the DateRange"""
+        return self.complement()
 
     def __repr__(self):
-        return f"DateRange[{len(self)}]({self.earliest}, {self.latest})"
+        return f"{type(self).__name__}[{len(self)}]({self.earliest}, {self.latest})"
 
     def __str__(self):
         return ' and\n'.join([f"from {inter.start} to {inter.end}" for inter in self])
 
     @staticmethod
-    def _sorted_interval_iter(interval_list_1: List[Interval], interval_list_2: List[Interval]):
+    def _sorted_interval_iter(*ranges: 'DateRange') -> Iterator[Tuple[int, int]]:
+        """Merge the (start, end) ordinals of any number of ranges ordered by start and then by end"""
         # Assumes the individual intervals are already in ascending order
-        intervals_1 = iter(interval_list_1)
-        intervals_2 = iter(interval_list_2)
+        if len(ranges) == 2:
+            return _merge(zip(ranges[0]._starts, ranges[0]._ends), zip(ranges[1]._starts, ranges[1]._ends))
+        return heapq.merge(*(zip(_range._starts, _range._ends) for _range in ranges))
 
-        interval_1 = next(intervals_1, None)
-        interval_2 = next(intervals_2, None)
-        while interval_1 or interval_2:
-            if interval_1 and interval_2:
-                if interval_1.start < interval_2.start:
-                    yield interval_1.copy()
-                    interval_1 = next(intervals_1, None)
-                    continue
-                if interval_1.start > interval_2.start:
-                    yield interval_2.copy()
-                    interval_2 = next(intervals_2, None)
-                    continue
-                if interval_1.end <= interval_2.end:
-                    yield interval_1.copy()
-                    interval_1 = next(intervals_1, None)
-                    continue
-                yield interval_2.copy()
-                interval_2 = next(intervals_2, None)
-                continue
-            if interval_1:
-                yield interval_1.copy()
-                interval_1 = next(intervals_1, None)
-                continue
-            yield interval_2.copy()
-            interval_2 = next(intervals_2, None)
+
+class FrozenDateRange(DateRange):
+    """
+    An immutable and hashable DateRange that can be used as a dict key or set member.
+    The hash, number of days and bounds are computed once and then cached.
+    All operators return new FrozenDateRanges, including the in-place operators
+    which rebind the name like they do for frozenset.
+    >>> holidays = FrozenDateRange(date(2021, 12, 24), date(2021, 12, 26))
+    >>> {holidays: 'christmas'}[FrozenDateRange(date(2021, 12, 24), date(2021, 12, 26))]
+    'christmas'
+    >>> holidays == holidays.thaw()
+    True
+    """
+
+    __slots__ = '_hash', '_days', '_bounds'
+
+    def __init__(self,
+                 start: Optional[date] = None,
+                 end: Optional[date] = None):
+        super().__init__(start, end)
+        self._hash = self._days = self._bounds = None
+
+    @classmethod
+    def _from_ordinals(cls, starts: array, ends: array) -> 'FrozenDateRange':
+        new = super()._from_ordinals(starts, ends)
+        new._hash = new._days = new._bounds = None
+        return new
+
+    @classmethod
+    def _from_views(cls, starts: Union[array, memoryview], ends: Union[array, memoryview]) -> 'FrozenDateRange':
+        """Immutable ranges can keep the views, which keep their buffer alive"""
+        return cls._from_ordinals(starts, ends)
+
+    def thaw(self) -> DateRange:
+        """Return a mutable copy of the FrozenDateRange"""
+        return DateRange._from_ordinals(_copy_ordinals(self._starts), _copy_ordinals(self._ends))
+
+    def freeze(self) -> 'FrozenDateRange':
+        return self
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self._starts.tobytes(), self._ends.tobytes()))
+        return self._hash
+
+    @property
+    def days(self) -> int:
+        """Return the number of days in the DateRange (inclusive)"""
+        if self._days is None:
+            self._days = super().days
+        return self._days
+
+    @property
+    def earliest(self) -> date:
+        """The earliest day in the DateRange"""
+        if self._bounds is None:
+            self._bounds = super().earliest, super().latest
+        return self._bounds[0]
+
+    @property
+    def latest(self) -> date:
+        """The latests day in the DateRange"""
+        if self._bounds is None:
+            self._bounds = super().earliest, super().latest
+        return self._bounds[1]
+
+    def _add(self, start: int, end: int):
+        raise TypeError(f"{type(self).__name__} can not be changed in place")
+
+    _remove = _add
+
+    __ior__ = DateRange.__or__
+    __iadd__ = DateRange.__or__
+    __iand__ = DateRange.__and__
+    __isub__ = DateRange.__sub__
+    __ixor__ = DateRange.__xor__
+
+
+class LazyDateRange:
+    """
+    An expression of DateRange operations that is only evaluated when the result is needed,
+    started with DateRange.lazy(). The operators (|, +, &, -, ^ and ~) build an expression
+    tree instead of a DateRange and chained unions and intersections become a single node.
+    Iterating, days, in and evaluate() force the expression, streaming the sorted intervals
+    of every leaf through the whole tree in one pass so no intermediate DateRanges are built.
+    The leaves are read when the expression is forced, not when it is built.
+    >>> jul = DateRange(date(2021, 7, 1), date(2021, 7, 31))
+    >>> aug = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+    >>> sep = DateRange(date(2021, 9, 1), date(2021, 9, 30))
+    >>> expression = (jul.lazy() | aug | sep) - date(2021, 8, 15)
+    >>> expression.days
+    91
+    >>> print(expression.explain())
+    subtract: merge with the streamed complement of the right side
+      union of 3: heap merge then coalesce
+        DateRange[1](2021-07-01, 2021-07-31)
+        DateRange[1](2021-08-01, 2021-08-31)
+        DateRange[1](2021-09-01, 2021-09-30)
+      DateRange[1](2021-08-15, 2021-08-15)
+    >>> print(expression.evaluate())
+    from 2021-07-01 to 2021-08-14 and
+    from 2021-08-16 to 2021-09-30
+    """
+
+    __slots__ = '_operator', '_operands'
+
+    _flattened = ('union', 'intersect')
+
+    def __init__(self, operator: str, operands: Tuple[Union['LazyDateRange', DateRange], ...]):
+        self._operator = operator
+        self._operands = operands
+
+    @staticmethod
+    def _wrap(other) -> Optional['LazyDateRange']:
+        if isinstance(other, LazyDateRange):
+            return other
+        if isinstance(other, DateRange):
+            return other.lazy()
+        if isinstance(other, date):
+            return DateRange(other, other).lazy()
+        return None
+
+    def _combine(self, operator: str, left, right) -> 'LazyDateRange':
+        left, right = self._wrap(left), self._wrap(right)
+        if left is None or right is None:
+            return NotImplemented
+        operands = []
+        for operand in (left, right):
+            if operator in self._flattened and operand._operator == operator:
+                operands.extend(operand._operands)
+            else:
+                operands.append(operand)
+        return LazyDateRange(operator, tuple(operands))
+
+    def __or__(self, other) -> 'LazyDateRange':
+        return self._combine('union', self, other)
+
+    def __ror__(self, other) -> 'LazyDateRange':
+        return self._combine('union', other, self)
+
+    __add__ = __or__
+    __radd__ = __ror__
+
+    def __and__(self, other) -> 'LazyDateRange':
+        return self._combine('intersect', self, other)
+
+    def __rand__(self, other) -> 'LazyDateRange':
+        return self._combine('intersect', other, self)
+
+    def __sub__(self, other) -> 'LazyDateRange':
+        return self._combine('subtract', self, other)
+
+    def __rsub__(self, other) -> 'LazyDateRange':
+        return self._combine('subtract', other, self)
+
+    def __xor__(self, other) -> 'LazyDateRange':
+        return self._combine('xor', self, other)
+
+    def __rxor__(self, other) -> 'LazyDateRange':
+        return self._combine('xor', other, self)
+
+    def __invert__(self) -> 'LazyDateRange':
+        return LazyDateRange('complement', (self,))
+
+    def lazy(self) -> 'LazyDateRange':
+        return self
+
+    def _intervals(self) -> Iterator[Tuple[int, int]]:
+        """Stream the sorted and coalesced (start, end) ordinals of the expression"""
+        operator, operands = self._operator, self._operands
+        if operator == 'range':
+            return zip(operands[0]._starts, operands[0]._ends)
+        streams = [operand._intervals() for operand in operands]
+        if operator == 'union':
+            return _coalesced(heapq.merge(*streams))
+        if operator == 'intersect':
+            intervals = streams[0]
+            for stream in streams[1:]:
+                intervals = _overlaps(_merge(intervals, stream))
+            return intervals
+        if operator == 'subtract':
+            return _overlaps(_merge(streams[0], _complement(streams[1])))
+        if operator == 'xor':
+            return _coalesced(_exclusive(_merge(*streams)))
+        return _complement(streams[0])
+
+    def evaluate(self) -> DateRange:
+        """Force the expression into a DateRange"""
+        return DateRange._from_ordinals(*_pack(self._intervals()))
+
+    def __iter__(self) -> Iterator[DateRange.Interval]:
+        """Iterate over the intervals of the result without storing them"""
+        from_ordinals = DateRange.Interval.from_ordinals
+        for start, end in self._intervals():
+            yield from_ordinals(start, end)
+
+    @property
+    def days(self) -> int:
+        """Return the number of days in the result (inclusive)"""
+        return sum(end - start + 1 for start, end in self._intervals())
+
+    def __bool__(self):
+        """If the result has any days, stopping the stream at the first interval"""
+        return next(self._intervals(), None) is not None
+
+    def __contains__(self, other: Union[date, DateRange]):
+        """If a date or DateRange is entirely within the result, a date stops the stream as soon as it is passed"""
+        if isinstance(other, date):
+            day = other.toordinal()
+            for start, end in self._intervals():
+                if start > day:
+                    return False
+                if day <= end:
+                    return True
+            return False
+        if isinstance(other, (DateRange, LazyDateRange)):
+            # Within if nothing is left after subtracting, which stops at the first day left over
+            return next((other.lazy() - self)._intervals(), None) is None
+        raise TypeError(f"'in <{type(self).__name__}>' requires a date or DateRange, not {type(other).__name__}")
+
+    _plans = {
+        'union': 'union of {count}: heap merge then coalesce',
+        'intersect': 'intersect of {count}: chained merges',
+        'subtract': 'subtract: merge with the streamed complement of the right side',
+        'xor': 'symmetric difference: merge then coalesce',
+        'complement': 'complement: stream the gaps',
+    }
+
+    def explain(self, _depth: int = 0) -> str:
+        """Describe how the expression will be evaluated, one line per node of the tree"""
+        indent = '  ' * _depth
+        if self._operator == 'range':
+            return f"{indent}{self._operands[0]!r}"
+        lines = [indent + self._plans[self._operator].format(count=len(self._operands))]
+        lines.extend(operand.explain(_depth + 1) for operand in self._operands)
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        if self._operator == 'range':
+            return f"LazyDateRange({self._operands[0]!r})"
+        return f"LazyDateRange({self._operator} of {len(self._operands)})"
+
+
+class RecurringDateRange:
+    """
+    The days of a periodic rule within a window, without storing an interval per occurrence.
+    A day is included if it falls in the window (inclusive) and its distance from the anchor,
+    modulo the period, is one of the offsets. Membership and days are worked out from the
+    rule, and intervals are only generated, a period at a time, for the parts a set
+    operation needs: intersecting with or subtracting from a DateRange only expands the rule
+    within that DateRange's intervals.
+    Set operations with a DateRange or date return a DateRange.
+    >>> weekdays = RecurringDateRange.weekdays(date(2021, 8, 1), date(2051, 7, 31))
+    >>> weekdays.days, date(2021, 8, 7) in weekdays
+    (7826, False)
+    >>> print(weekdays & DateRange(date(2021, 8, 1), date(2021, 8, 10)))
+    from 2021-08-02 to 2021-08-06 and
+    from 2021-08-09 to 2021-08-10
+    """
+
+    __slots__ = '_start', '_end', '_anchor', '_period', '_offsets', '_mask', '_runs'
+
+    def __init__(self,
+                 start: Optional[date],
+                 end: Optional[date],
+                 period: int,
+                 offsets: Iterable[int] = (0,),
+                 anchor: Optional[date] = None):
+        window = DateRange.Interval(start, end)
+        self._start, self._end = window.ordinals()
+        self._anchor = anchor.toordinal() if anchor is not None else self._start
+        if period < 1:
+            raise ValueError(f"Period must be at least 1 day, not {period}")
+        self._period = period
+        self._offsets = tuple(sorted(set(offsets)))
+        if self._offsets and not 0 <= self._offsets[0] <= self._offsets[-1] < period:
+            raise ValueError(f"Offsets must be from 0 to {period - 1}")
+        self._mask = bytearray(period)
+        for offset in self._offsets:
+            self._mask[offset] = 1
+        # Consecutive offsets as (first, last) runs, so days are generated an interval at a time
+        runs = []
+        for offset in self._offsets:
+            if runs and runs[-1][1] == offset - 1:
+                runs[-1][1] = offset
+            else:
+                runs.append([offset, offset])
+        self._runs = [tuple(run) for run in runs]
+
+    @classmethod
+    def every(cls, start: Optional[date], end: Optional[date], days: int) -> 'RecurringDateRange':
+        """Every days-th day of the window, starting on its first day"""
+        return cls(start, end, days)
+
+    @classmethod
+    def weekdays(cls, start: Optional[date], end: Optional[date],
+                 weekdays: Iterable[int] = (0, 1, 2, 3, 4)) -> 'RecurringDateRange':
+        """The given weekdays within the window, Monday being 0 like date.weekday(), by default Monday to Friday"""
+        weekdays = tuple(weekdays)
+        if not all(0 <= weekday <= 6 for weekday in weekdays):
+            raise ValueError(f"Weekdays must be from 0 to 6: {weekdays}")
+        # The first of January of year 1 is a Monday
+        return cls(start, end, 7, weekdays, anchor=date.min)
+
+    @classmethod
+    def monthly(cls, start: Optional[date], end: Optional[date], days: Iterable[int]) -> 'RecurringDateRange':
+        """
+        The given days of every month within the window, negative days counting from the end
+        of the month (-1 is the last day). Days that a month does not have are skipped.
+        """
+        return cls(start, end, _GREGORIAN_CYCLE, _monthly_offsets(tuple(sorted(set(days)))), anchor=date.min)
+
+    @property
+    def days(self) -> int:
+        """Return the number of days in the RecurringDateRange (inclusive)"""
+        return self._days_before(self._end + 1) - self._days_before(self._start)
+
+    def _days_before(self, day: int) -> int:
+        """The number of days matching the rule from the anchor up to an ordinal, negative before the anchor"""
+        cycles, offset = divmod(day - self._anchor, self._period)
+        return cycles * len(self._offsets) + bisect_left(self._offsets, offset)
+
+    @property
+    def earliest(self) -> Optional[date]:
+        """The earliest day in the RecurringDateRange"""
+        if not self._offsets:
+            return None
+        offset = (self._start - self._anchor) % self._period
+        index = bisect_left(self._offsets, offset)
+        day = self._start + (self._offsets[index] if index < len(self._offsets)
+                             else self._offsets[0] + self._period) - offset
+        return date.fromordinal(day) if day <= self._end else None
+
+    @property
+    def latest(self) -> Optional[date]:
+        """The latest day in the RecurringDateRange"""
+        if not self._offsets:
+            return None
+        offset = (self._end - self._anchor) % self._period
+        index = bisect_right(self._offsets, offset) - 1
+        day = self._end - offset + (self._offsets[index] if index >= 0 else self._offsets[-1] - self._period)
+        return date.fromordinal(day) if day >= self._start else None
+
+    def _intervals(self, lower: int = _MIN, upper: int = _MAX) -> Iterator[Tuple[int, int]]:
+        """Generate the coalesced intervals of the rule within lower and upper and the window"""
+        lower, upper = max(lower, self._start), min(upper, self._end)
+        if lower > upper or not self._runs:
+            return iter(())
+        return _coalesced(self._generate(lower, upper))
+
+    def _generate(self, lower: int, upper: int) -> Iterator[Tuple[int, int]]:
+        runs = self._runs
+        offset = (lower - self._anchor) % self._period
+        base = lower - offset
+        # Start from the first run that has not ended by the lower bound
+        index = bisect_left(runs, (offset + 1,)) - 1
+        if index < 0 or runs[index][1] < offset:
+            index += 1
+        while True:
+            for first, last in islice(runs, index, None):
+                start, end = base + first, base + last
+                if start > upper:
+                    return
+                yield max(start, lower), min(end, upper)
+            index = 0
+            base += self._period
+
+    def _expand_within(self, other: DateRange) -> Iterator[Tuple[int, int]]:
+        """The intervals of the rule within the intervals of a DateRange"""
+        for start, end in zip(other._starts, other._ends):
+            yield from self._intervals(start, end)
+
+    def to_date_range(self) -> DateRange:
+        """Expand every occurrence within the window into a DateRange"""
+        return DateRange._from_ordinals(*_pack(self._intervals()))
+
+    def __iter__(self) -> Iterator[DateRange.Interval]:
+        """Iterate over the intervals, generating them as they are needed"""
+        from_ordinals = DateRange.Interval.from_ordinals
+        for start, end in self._intervals():
+            yield from_ordinals(start, end)
+
+    def __contains__(self, other: Union[date, DateRange]):
+        """If a date, or every day of a DateRange, is in the RecurringDateRange"""
+        if isinstance(other, date):
+            day = other.toordinal()
+            return self._start <= day <= self._end and bool(self._mask[(day - self._anchor) % self._period])
+        if isinstance(other, DateRange):
+            if other and (other._starts[0] < self._start or other._ends[-1] > self._end):
+                return False
+            return all(self._days_before(end + 1) - self._days_before(start) == end - start + 1
+                       for start, end in zip(other._starts, other._ends))
+        raise TypeError(f"'in <{type(self).__name__}>' requires a date or DateRange, not {type(other).__name__}")
+
+    @type_check
+    def __and__(self, other: Union[date, DateRange]) -> DateRange:
+        return type(other)._from_ordinals(*_pack(self._expand_within(other)))
+
+    __rand__ = __and__
+
+    @type_check
+    def __or__(self, other: Union[date, DateRange]) -> DateRange:
+        return type(other)._from_ordinals(*_coalesce(_merge(self._intervals(), zip(other._starts, other._ends))))
+
+    __ror__ = __or__
+    __add__ = __or__
+    __radd__ = __or__
+
+    @type_check
+    def __sub__(self, other: Union[date, DateRange]) -> DateRange:
+        return type(other)._from_ordinals(*self.to_date_range()._subtract(other))
+
+    @type_check
+    def __rsub__(self, other: Union[date, DateRange]) -> DateRange:
+        return type(other)._from_ordinals(*other._subtract(self & other))
+
+    @type_check
+    def __xor__(self, other: Union[date, DateRange]) -> DateRange:
+        return type(other)._from_ordinals(
+            *_coalesce(_exclusive(_merge(self._intervals(), zip(other._starts, other._ends)))))
+
+    __rxor__ = __xor__
+
+    def __repr__(self):
+        return (f"{type(self).__name__}({date.fromordinal(self._start)}, {date.fromordinal(self._end)}, "
+                f"period={self._period}, offsets={len(self._offsets)}, anchor={date.fromordinal(self._anchor)})")
+
+
+class DateRangeBuilder:
+    """
+    Builds a DateRange from dates, Intervals, DateRanges or (start, end) tuples added one
+    at a time and in any order, e.g. dates read from a log file. Items are buffered and
+    every chunk_size intervals the buffer is sorted and merged into the result at once,
+    instead of re-merging the whole range for every item like += does.
+    >>> builder = DateRangeBuilder()
+    >>> for day in (date(2021, 8, 3), date(2021, 8, 1), date(2021, 8, 2), date(2021, 8, 9)):
+    ...     builder.add(day)
+    >>> print(builder.build())
+    from 2021-08-01 to 2021-08-03 and
+    from 2021-08-09 to 2021-08-09
+
+    For streams that are already in order coalesce_sorted yields each finished Interval as
+    soon as the stream has moved past it, keeping nothing else in memory.
+    >>> list(DateRangeBuilder.coalesce_sorted([date(2021, 8, 1), date(2021, 8, 2), date(2021, 8, 9)]))
+    [Interval(2021-08-01, 2021-08-02), Interval(2021-08-09, 2021-08-09)]
+    """
+
+    __slots__ = '_chunk_size', '_buffer', '_starts', '_ends'
+
+    def __init__(self, chunk_size: int = 65536):
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1: {chunk_size}")
+        self._chunk_size = chunk_size
+        self._buffer = []
+        self._starts = array(_TYPECODE)
+        self._ends = array(_TYPECODE)
+
+    def add(self, item: Union[DateRange, DateRange.Interval, date, Tuple[Optional[date], Optional[date]]]):
+        """Add a single date, Interval, DateRange or (start, end) tuple"""
+        if isinstance(item, date):
+            day = item.toordinal()
+            self._buffer.append((day, day))
+        else:
+            self._buffer.extend(DateRange._item_intervals(item))
+        if len(self._buffer) >= self._chunk_size:
+            self._flush()
+
+    def extend(self, items: Iterable[Union[DateRange, DateRange.Interval, date, Tuple[Optional[date], Optional[date]]]]):
+        """Add every item of an iterable"""
+        for item in items:
+            self.add(item)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        self._buffer.sort()
+        chunk = _coalesced(self._buffer)
+        self._starts, self._ends = _coalesce(_merge(zip(self._starts, self._ends), chunk))
+        self._buffer.clear()
+
+    def build(self) -> DateRange:
+        """Return a DateRange of everything added so far, more items can be added afterwards"""
+        self._flush()
+        return DateRange._from_ordinals(array(_TYPECODE, self._starts), array(_TYPECODE, self._ends))
+
+    @staticmethod
+    def coalesce_sorted(items: Iterable[Union[DateRange, DateRange.Interval, date,
+                                              Tuple[Optional[date], Optional[date]]]]) -> Iterator[DateRange.Interval]:
+        """
+        Yield the coalesced Intervals of items sorted by their start, each one as soon as an
+        item starts after it. Raises ValueError for an item starting before the current Interval.
+        """
+        from_ordinals = DateRange.Interval.from_ordinals
+        start = end = None
+        for item in items:
+            if isinstance(item, date):
+                day = item.toordinal()
+                intervals = (day, day),
+            else:
+                intervals = DateRange._item_intervals(item)
+            for next_start, next_end in intervals:
+                if start is None:
+                    start, end = next_start, next_end
+                elif next_start > end + 1:
+                    yield from_ordinals(start, end)
+                    start, end = next_start, next_end
+                elif next_start < start:
+                    raise ValueError(f"Items are not sorted: {item} starts before {from_ordinals(start, end)}")
+                elif next_end > end:
+                    end = next_end
+        if start is not None:
+            yield from_ordinals(start, end)
+
+
+class _IntervalTree:
+    """
+    A centered interval tree over the intervals of some keyed ranges, built once. Keys whose
+    range was replaced or deleted since are marked stale and skipped in the results.
+    """
+
+    __slots__ = ('ranges', 'size', 'stale', 'centers', 'lefts', 'rights', 'by_start', 'by_end')
+
+    def __init__(self, ranges: Dict[Hashable, FrozenDateRange]):
+        self.ranges = ranges
+        self.stale = set()
+        self.centers, self.lefts, self.rights, self.by_start, self.by_end = [], [], [], [], []
+        intervals = [(start, end, key) for key, date_range in ranges.items()
+                     for start, end in zip(date_range._starts, date_range._ends)]
+        intervals.sort(key=itemgetter(0))
+        self.size = len(intervals)
+        if not intervals:
+            return
+
+        # (intervals sorted by start, parent node, children list of the parent)
+        stack = [(intervals, -1, None)]
+        while stack:
+            intervals, parent, children = stack.pop()
+            node = len(self.centers)
+            if children is not None:
+                children[parent] = node
+            # The middle interval by start contains the center so no node is empty
+            center = intervals[len(intervals) // 2][0]
+            left = [interval for interval in intervals if interval[1] < center]
+            right = [interval for interval in intervals if interval[0] > center]
+            here = [interval for interval in intervals if interval[0] <= center <= interval[1]]
+            by_end = sorted(here, key=itemgetter(1), reverse=True)
+
+            self.centers.append(center)
+            self.lefts.append(-1)
+            self.rights.append(-1)
+            self.by_start.append((array(_TYPECODE, (interval[0] for interval in here)),
+                                  [interval[2] for interval in here]))
+            # Ends are negated so the descending ends can be searched with bisect
+            self.by_end.append((array(_TYPECODE, (-interval[1] for interval in by_end)),
+                                [interval[2] for interval in by_end]))
+            if left:
+                stack.append((left, node, self.lefts))
+            if right:
+                stack.append((right, node, self.rights))
+
+    def live_ranges(self) -> Dict[Hashable, FrozenDateRange]:
+        if not self.stale:
+            return self.ranges
+        return {key: date_range for key, date_range in self.ranges.items() if key not in self.stale}
+
+    def stab(self, day: int) -> List[Hashable]:
+        keys = []
+        node = 0 if self.centers else -1
+        while node != -1:
+            center = self.centers[node]
+            if day < center:
+                starts, node_keys = self.by_start[node]
+                keys += node_keys[:bisect_right(starts, day)]
+                node = self.lefts[node]
+            elif day > center:
+                ends, node_keys = self.by_end[node]
+                keys += node_keys[:bisect_right(ends, -day)]
+                node = self.rights[node]
+            else:
+                keys += self.by_start[node][1]
+                break
+        if self.stale:
+            keys = [key for key in keys if key not in self.stale]
+        return keys
+
+    def overlapping(self, lower: int, upper: int, keys: Dict[Hashable, None]):
+        """Add the keys with an interval overlapping lower to upper, stale ones included"""
+        stack = [0] if self.centers else []
+        while stack:
+            node = stack.pop()
+            center = self.centers[node]
+            if upper < center:
+                starts, node_keys = self.by_start[node]
+                keys.update(dict.fromkeys(node_keys[:bisect_right(starts, upper)]))
+                if self.lefts[node] != -1:
+                    stack.append(self.lefts[node])
+            elif lower > center:
+                ends, node_keys = self.by_end[node]
+                keys.update(dict.fromkeys(node_keys[:bisect_right(ends, -lower)]))
+                if self.rights[node] != -1:
+                    stack.append(self.rights[node])
+            else:
+                keys.update(dict.fromkeys(self.by_start[node][1]))
+                if self.lefts[node] != -1:
+                    stack.append(self.lefts[node])
+                if self.rights[node] != -1:
+                    stack.append(self.rights[node])
+
+
+class DateRangeIndex:
+    """
+    Indexes many keyed DateRanges to find the ones containing a date (a stabbing query)
+    or overlapping a window in O(log² n + k), where n is the number of indexed intervals
+    and k the number of matches.
+    The intervals are kept in a few centered interval trees, each at least twice the size
+    of the next one. Inserts are buffered and the buffer becomes a tree of its own once it
+    holds enough intervals, merged with the smaller trees until the sizes halve again, so
+    every interval is rebuilt O(log n) times. Deleted intervals are skipped until they add
+    up to a fraction of the trees, which are then rebuilt into one.
+    Ranges are frozen when inserted, later changes to a mutable DateRange need another insert.
+    >>> index = DateRangeIndex({'aug': DateRange(date(2021, 8, 1), date(2021, 8, 31)),
+    ...                         'sep': DateRange(date(2021, 9, 1), date(2021, 9, 30))})
+    >>> index.stab(date(2021, 8, 15))
+    ['aug']
+    >>> sorted(index.overlapping(DateRange(date(2021, 8, 31), date(2021, 9, 1))))
+    ['aug', 'sep']
+    """
+
+    __slots__ = ('_ranges', '_pending', '_pending_size', '_trees', '_tree_size', '_stale_size')
+
+    # The buffered inserts become a tree once they hold this many intervals, and the trees
+    # are rebuilt once the deleted intervals reach this many or an eighth of them
+    _rebuild_minimum = 64
+    _rebuild_fraction = 8
+
+    def __init__(self, ranges: Optional[Union[Mapping[Hashable, DateRange],
+                                              Iterable[Tuple[Hashable, DateRange]]]] = None):
+        self._ranges: Dict[Hashable, FrozenDateRange] = {}
+        self._pending: Dict[Hashable, FrozenDateRange] = {}
+        self._pending_size = 0
+        # From the largest to the smallest
+        self._trees: List[_IntervalTree] = []
+        self._tree_size = 0
+        self._stale_size = 0
+        if ranges is not None:
+            for key, date_range in (ranges.items() if isinstance(ranges, Mapping) else ranges):
+                self.insert(key, date_range)
+
+    def __len__(self):
+        """Return the number of indexed ranges"""
+        return len(self._ranges)
+
+    def __contains__(self, key: Hashable):
+        return key in self._ranges
+
+    def __getitem__(self, key: Hashable) -> FrozenDateRange:
+        return self._ranges[key]
+
+    def insert(self, key: Hashable, date_range: Union[DateRange, date]):
+        """Index a DateRange under a key, replacing any range already indexed under it"""
+        date_range = DateRange._coerce(date_range).freeze()
+        if key in self._ranges:
+            self._discard(key)
+        self._ranges[key] = date_range
+        # Empty ranges never match, so they are only kept in _ranges
+        if date_range:
+            self._pending[key] = date_range
+            self._pending_size += len(date_range)
+
+    def delete(self, key: Hashable):
+        """Remove the range indexed under a key, raises KeyError if there is none"""
+        if key not in self._ranges:
+            raise KeyError(key)
+        self._discard(key)
+
+    def _discard(self, key: Hashable):
+        date_range = self._ranges.pop(key)
+        if self._pending.pop(key, None) is not None:
+            self._pending_size -= len(date_range)
+            return
+        for tree in self._trees:
+            if tree.ranges.get(key) is date_range:
+                # The tree still holds its intervals, they are skipped until it is rebuilt
+                tree.stale.add(key)
+                self._stale_size += len(date_range)
+                return
+
+    def _refresh(self):
+        if self._stale_size >= max(self._rebuild_minimum, self._tree_size // self._rebuild_fraction):
+            self._build()
+        elif self._pending_size >= self._rebuild_minimum:
+            ranges, size = self._pending, self._pending_size
+            # Merging the trees up to twice the size of the new one keeps each more than twice the next
+            while self._trees and self._trees[-1].size <= 2 * size:
+                tree = self._trees.pop()
+                stale_size = sum(len(tree.ranges[key]) for key in tree.stale)
+                self._tree_size -= tree.size
+                self._stale_size -= stale_size
+                size += tree.size - stale_size
+                ranges = {**tree.live_ranges(), **ranges}
+            self._add_tree(ranges)
+
+    def _add_tree(self, ranges: Dict[Hashable, FrozenDateRange]):
+        tree = _IntervalTree(ranges)
+        self._trees.append(tree)
+        self._tree_size += tree.size
+        self._pending = {}
+        self._pending_size = 0
+
+    def _build(self):
+        """Rebuild a single tree from every indexed range"""
+        self._trees = []
+        self._tree_size = self._stale_size = 0
+        self._add_tree(dict(self._ranges))
+
+    def _stab(self, day: int) -> List[Hashable]:
+        keys = []
+        for tree in self._trees:
+            keys += tree.stab(day)
+        for key, date_range in self._pending.items():
+            starts = date_range._starts
+            index = bisect_right(starts, day) - 1
+            if index >= 0 and day <= date_range._ends[index]:
+                keys.append(key)
+        return keys
+
+    def stab(self, day: date) -> List[Hashable]:
+        """Return the keys of the ranges containing a date"""
+        self._refresh()
+        return self._stab(day.toordinal())
+
+    def stab_many(self, days: Iterable[date]) -> List[List[Hashable]]:
+        """Return the keys of the ranges containing each of many dates"""
+        self._refresh()
+        return [self._stab(day.toordinal()) for day in days]
+
+    def overlapping(self, window: Union[DateRange, date]) -> List[Hashable]:
+        """Return the keys of the ranges sharing at least one day with a window"""
+        self._refresh()
+        window = DateRange._coerce(window)
+        keys = {}
+        for tree in self._trees:
+            tree_keys = {}
+            for lower, upper in zip(window._starts, window._ends):
+                tree.overlapping(lower, upper, tree_keys)
+            # A stale key may be live in another tree, so they are dropped per tree
+            for key in tree.stale:
+                tree_keys.pop(key, None)
+            keys.update(tree_keys)
+        for key, date_range in self._pending.items():
+            if date_range.overlaps(window):
+                keys[key] = None
+        return list(keys)
+
+
+def _encode_collection(ranges: List[DateRange]) -> Iterator[bytes]:
+    """The binary format of a collection of DateRanges, in pieces"""
+    offsets = array(_OFFSET_TYPECODE, [0])
+    for _range in ranges:
+        offsets.append(offsets[-1] + len(_range))
+    yield _HEADER.pack(_MAGIC, _VERSION, _KIND_COLLECTION, len(ranges))
+    yield _little_endian(offsets).tobytes()
+    for _range in ranges:
+        yield _little_endian(_range._starts).tobytes()
+    for _range in ranges:
+        yield _little_endian(_range._ends).tobytes()
+
+
+def _decode_collection(buffer: memoryview) -> Tuple[Union[memoryview, array], ...]:
+    """Views of the offsets, starts and ends of a collection in the binary format"""
+    count = _read_header(buffer, _KIND_COLLECTION)
+    offset = _HEADER.size
+    offsets = _view(buffer, offset, count + 1, _OFFSET_TYPECODE)
+    total = offsets[-1]
+    offset += len(offsets) * offsets.itemsize
+    if len(buffer) != offset + 2 * total * array(_TYPECODE).itemsize:
+        raise ValueError("Data does not match the number of intervals in its offsets")
+    # Every range is served as a slice between two offsets, so they must start at 0 and never decrease
+    if offsets[0] != 0 or any(previous > following for previous, following in zip(offsets, offsets[1:])):
+        raise ValueError("Data holds invalid offsets")
+    starts = _view(buffer, offset, total, _TYPECODE)
+    return offsets, starts, _view(buffer, offset + total * starts.itemsize, total, _TYPECODE)
+
+
+def write_date_ranges(path: str, ranges: Iterable[Union[DateRange, date]]):
+    """Write a collection of DateRanges to a file in the binary format, to be read by DateRangeReader"""
+    ranges = [DateRange._coerce(_range) for _range in ranges]
+    with open(path, 'wb') as file:
+        file.writelines(_encode_collection(ranges))
+
+
+class DateRangeReader:
+    """
+    Reads a collection of DateRanges written by write_date_ranges by memory mapping the file.
+    Ranges are served as FrozenDateRanges whose ordinals are views of the mapped file, so
+    nothing is decoded until the intervals are iterated over or operated on.
+    Ranges can outlive the reader, the mapping is then released once they are all freed.
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'ranges.bin')
+    >>> write_date_ranges(path, [DateRange(date(2021, 8, 1), date(2021, 8, 31)), date(2021, 9, 1)])
+    >>> with DateRangeReader(path) as reader:
+    ...     print(len(reader), reader[1])
+    2 from 2021-09-01 to 2021-09-01
+    """
+
+    __slots__ = '_mmap', '_offsets', '_starts', '_ends'
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._offsets, self._starts, self._ends = _decode_collection(memoryview(self._mmap))
+        except ValueError:
+            self.close()
+            raise
+
+    def __len__(self):
+        """Return the number of ranges"""
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> FrozenDateRange:
+        if not -len(self) <= index < len(self):
+            raise IndexError("DateRangeReader index out of range")
+        index %= len(self)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return FrozenDateRange._from_ordinals(self._starts[start:end], self._ends[start:end])
+
+    def __iter__(self) -> Iterator[FrozenDateRange]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        self._offsets = self._starts = self._ends = ()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Ranges served from the file still use it, the mapping goes with the last of them
+
+    def __enter__(self) -> 'DateRangeReader':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_BATCH_OPERATIONS: Dict[str, Callable[[DateRange, DateRange], Union[DateRange, bool]]] = {
+    'or': or_,
+    'and': and_,
+    'sub': sub,
+    'xor': xor,
+    'contains': lambda left, right: right in left,
+}
+
+
+def _batch_chunk(operation: str, data: bytes) -> bytes:
+    """
+    Apply an operation to a chunk of pairs in a worker process. The pairs arrive as one
+    collection holding every left operand followed by every right operand, and the results
+    go back as a collection of ranges, or one byte per pair for contains.
+    """
+    offsets, starts, ends = _decode_collection(memoryview(data))
+    ranges = [DateRange._from_ordinals(starts[offsets[index]:offsets[index + 1]],
+                                       ends[offsets[index]:offsets[index + 1]]) for index in range(len(offsets) - 1)]
+    count = len(ranges) // 2
+    function = _BATCH_OPERATIONS[operation]
+    results = [function(left, right) for left, right in zip(ranges[:count], ranges[count:])]
+    if operation == 'contains':
+        return bytes(results)
+    return b''.join(_encode_collection(results))
+
+
+def batch(operation: str,
+          pairs: Iterable[Tuple[Union[DateRange, date], Union[DateRange, date]]],
+          processes: Optional[int] = None,
+          chunk_size: int = 1024,
+          executor: Optional[Executor] = None) -> List[Union[DateRange, bool]]:
+    """
+    Apply a set operation ('or', 'and', 'sub' or 'xor') or 'contains' (right in left) to
+    every (left, right) pair and return the results in order, equal to those of the
+    operators themselves.
+    Chunks of chunk_size pairs are sent to a pool of processes (or to executor) in the
+    binary format of write_date_ranges. The pairs are processed serially when there is a
+    single process or chunk, or when a process pool cannot be started.
+    >>> august = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+    >>> batch('contains', [(august, date(2021, 8, 15)), (august, date(2021, 9, 15))])
+    [True, False]
+    """
+    if operation not in _BATCH_OPERATIONS:
+        raise ValueError(f"Unknown batch operation: {operation}, expected one of {', '.join(_BATCH_OPERATIONS)}")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, not {chunk_size}")
+    pairs = list(pairs)
+    for left, right in pairs:
+        if not isinstance(left, DateRange) and (operation == 'contains' or not isinstance(right, DateRange)):
+            raise TypeError(f"Cannot apply {operation} to {type(left)} and {type(right)}")
+    if executor is None:
+        processes = (os.cpu_count() or 1) if processes is None else processes
+        if processes > 1 and len(pairs) > chunk_size:
+            try:
+                pool = ProcessPoolExecutor(processes)
+            except (OSError, NotImplementedError):  # No process support, e.g. no working semaphores
+                pool = None
+            if pool is not None:
+                with pool:
+                    return batch(operation, pairs, chunk_size=chunk_size, executor=pool)
+        function = _BATCH_OPERATIONS[operation]
+        return [function(left, right) for left, right in pairs]
+
+    chunks = [pairs[index:index + chunk_size] for index in range(0, len(pairs), chunk_size)]
+    coerce = DateRange._coerce
+    encoded = (b''.join(_encode_collection([coerce(left) for left, _ in chunk] + [coerce(right) for _, right in chunk]))
+               for chunk in chunks)
+    results = []
+    for chunk, data in zip(chunks, executor.map(_batch_chunk, [operation] * len(chunks), encoded)):
+        if operation == 'contains':
+            results.extend(map(bool, data))
+            continue
+        offsets, starts, ends = _decode_collection(memoryview(data))
+        for index, (left, right) in enumerate(chunk):
+            # The type the operator would return, __rsub__ coerces a date on the left to a DateRange
+            cls = type(left) if isinstance(left, DateRange) else DateRange if operation == 'sub' else type(right)
+            start, end = offsets[index], offsets[index + 1]
+            results.append(cls._from_views(starts[start:end], ends[start:end]))
+    return results
+
+
+class OperationEvent(NamedTuple):
+    """One instrumented DateRange operation, passed to the instrumentation callbacks"""
+    operation: str
+    input_intervals: int
+    output_intervals: int
+    seconds: float
+
+
+class _Instrumentation:
+    """
+    Opt-in counters and timing for DateRange operations. While disabled the DateRange
+    methods are the plain ones so the only overhead is one check when type_check wraps
+    a date, enabling swaps timed wrappers in on the classes and disabling puts the
+    originals back. The wraps are counted by type_check itself, whatever method did them.
+    """
+
+    # Every method name that is wrapped, with the operation it is counted under
+    operations = {
+        '__or__': '__or__', '__ror__': '__or__', '__add__': '__or__', '__radd__': '__or__',
+        '__ior__': '__ior__', '__iadd__': '__ior__',
+        '__and__': '__and__', '__rand__': '__and__',
+        '__iand__': '__iand__',
+        '__sub__': '__sub__', '__rsub__': '__rsub__', '__isub__': '__isub__',
+        '__xor__': '__xor__', '__rxor__': '__xor__', '__ixor__': '__ixor__',
+        '__contains__': '__contains__',
+        'copy': 'copy',
+    }
+
+    def __init__(self):
+        self.callbacks: List[Callable[[OperationEvent], None]] = []
+        self.originals: Dict[Tuple[type, str], Callable] = {}
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.originals)
+
+    def enable(self):
+        if self.enabled:
+            return
+        for cls in (DateRange, FrozenDateRange):
+            for name, operation in self.operations.items():
+                if name in vars(cls):
+                    original = vars(cls)[name]
+                    self.originals[cls, name] = original
+                    setattr(cls, name, self.wrap(original, operation))
+
+    def disable(self):
+        for (cls, name), original in self.originals.items():
+            setattr(cls, name, original)
+        self.originals.clear()
+
+    def wrap(self, function: Callable, operation: str) -> Callable:
+        record = self.record
+
+        @wraps(function)
+        def instrumented(self, *args):
+            other = args[0] if args else None
+            # Counted before the call, the in-place operators change self
+            input_intervals = self._extent()[2] + (other._extent()[2] if isinstance(other, DateRange) else isinstance(other, date))
+            start = perf_counter()
+            result = function(self, *args)
+            seconds = perf_counter() - start
+            record(operation, input_intervals, result._extent()[2] if isinstance(result, DateRange) else 0, seconds)
+            return result
+
+        return instrumented
+
+    def record(self, operation: str, input_intervals: int, output_intervals: int, seconds: float):
+        stats = self.stats.get(operation)
+        if stats is None:
+            stats = self.stats[operation] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                             'input_intervals': 0, 'max_input_intervals': 0,
+                                             'output_intervals': 0}
+        stats['calls'] += 1
+        stats['seconds'] += seconds
+        stats['input_intervals'] += input_intervals
+        stats['output_intervals'] += output_intervals
+        if seconds > stats['max_seconds']:
+            stats['max_seconds'] = seconds
+        if input_intervals > stats['max_input_intervals']:
+            stats['max_input_intervals'] = input_intervals
+        if self.callbacks:
+            event = OperationEvent(operation, input_intervals, output_intervals, seconds)
+            for callback in self.callbacks:
+                callback(event)
+
+
+_instrumentation = _Instrumentation()
+
+
+def enable_instrumentation(callback: Optional[Callable[[OperationEvent], None]] = None):
+    """
+    Start counting calls, interval counts and time for the DateRange operators, copy and the
+    dates wrapped into DateRanges by type_check. A callback, if given, is registered as with
+    add_instrumentation_callback. There is no overhead until this is called.
+    """
+    if callback is not None:
+        add_instrumentation_callback(callback)
+    _instrumentation.enable()
+
+
+def disable_instrumentation():
+    """Stop instrumenting, the counters are kept until reset_instrumentation"""
+    _instrumentation.disable()
+
+
+def add_instrumentation_callback(callback: Callable[[OperationEvent], None]):
+    """Call a function with an OperationEvent after every instrumented operation"""
+    _instrumentation.callbacks.append(callback)
+
+
+def remove_instrumentation_callback(callback: Callable[[OperationEvent], None]):
+    _instrumentation.callbacks.remove(callback)
+
+
+def instrumentation_snapshot() -> Dict[str, Dict[str, float]]:
+    """
+    Return a copy of the counters by operation: calls, seconds, max_seconds, input_intervals,
+    max_input_intervals and output_intervals. Dates wrapped by type_check are under 'type_check'.
+    """
+    return {operation: dict(stats) for operation, stats in _instrumentation.stats.items()}
+
+
+def reset_instrumentation():
+    """Clear the counters"""
+    _instrumentation.stats.clear()
@@ -1,7 +1,38 @@
-from datetime import date
-from unittest import TestCase, skip
-
-from daterange import DateRange
+import copy
+import operator
+import os
+import pickle
+import random
+import tempfile
+import tracemalloc
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+import daterange
+from daterange import DateRange, DateRangeBuilder, DateRangeIndex, DateRangeReader, FrozenDateRange, LazyDateRange, \
+    OperationEvent, RecurringDateRange, disable_instrumentation, enable_instrumentation, instrumentation_snapshot, \
+    batch, remove_instrumentation_callback, reset_instrumentation, write_date_ranges
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def random_range(rng: random.Random, count: int, first: int = 737000, span: int = 400) -> DateRange:
+    """A DateRange built from random one to ten day intervals, mainly as an oracle for set operations"""
+    new = DateRange()
+    for _ in range(count):
+        start = rng.randint(first, first + span)
+        new += DateRange(date.fromordinal(start), date.fromordinal(start + rng.randint(0, 9)))
+    return new
+
+
+def day_set(date_range: DateRange) -> set:
+    return {day for interval in date_range for day in range(interval.start.toordinal(), interval.end.toordinal() + 1)}
 
 
 class TestDateRange(TestCase):
@@ -69,40 +100,25 @@ class TestDateRange(TestCase):
         self.i_may_jun_jul = DateRange.Interval(may1, jul31)
         self.i_aug_sep_oct = DateRange.Interval(aug1, oct31)
 
-        self.not_aug = DateRange()
-        self.not_aug._intervals.append(DateRange.Interval(None, jul31))
-        self.not_aug._intervals.append(DateRange.Interval(sep1, None))
+        self.not_aug = DateRange(sep1, jul31)
 
-        self.not_aug_oct = DateRange()
-        self.not_aug_oct._intervals.append(DateRange.Interval(None, jul31))
-        self.not_aug_oct._intervals.append(DateRange.Interval(sep1, sep30))
-        self.not_aug_oct._intervals.append(DateRange.Interval(nov1, None))
+        self.not_aug_oct = DateRange(None, jul31) + DateRange(sep1, sep30) + DateRange(nov1, None)
 
-        self.to_aug = DateRange()
-        self.to_aug._intervals.append(DateRange.Interval(None, jul31))
+        self.to_aug = DateRange(None, jul31)
 
-        self.from_aug = DateRange()
-        self.from_aug._intervals.append(DateRange.Interval(aug1, None))
+        self.from_aug = DateRange(aug1, None)
 
         self.no_time = DateRange()
 
         self.every_other_day_jun = DateRange()
         for day in range(1, 30 + 1, 2):
-            interval = DateRange.Interval(date(2021, 6, day), date(2021, 6, day))
-            self.every_other_day_jun._intervals.append(interval)
+            self.every_other_day_jun += date(2021, 6, day)
 
         self.every_other_day_jul = DateRange()
         for day in range(1, 31 + 1, 2):
-            interval = DateRange.Interval(date(2021, 7, day), date(2021, 7, day))
-            self.every_other_day_jul._intervals.append(interval)
+            self.every_other_day_jul += date(2021, 7, day)
 
-        self.every_other_day_jun_jul = DateRange()
-        for day in range(1, 30 + 1, 2):
-            interval = DateRange.Interval(date(2021, 6, day), date(2021, 6, day))
-            self.every_other_day_jun_jul._intervals.append(interval)
-        for day in range(1, 31 + 1, 2):
-            interval = DateRange.Interval(date(2021, 7, day), date(2021, 7, day))
-            self.every_other_day_jun_jul._intervals.append(interval)
+        self.every_other_day_jun_jul = self.every_other_day_jun + self.every_other_day_jul
 
     def test_interval_subtract(self):
         # The bracket subtracts from the parenthesis
@@ -309,7 +325,7 @@ class TestDateRange(TestCase):
             for day in range(30, 1 - 1, -2):
                 every_other_day_backward += date(2021, 6, day)
             self.assertEqual(15, len(every_other_day_backward))
-            self.assertEqual(sorted(every_other_day_backward._intervals), every_other_day_backward.intervals)
+            self.assertEqual(sorted(every_other_day_backward.intervals), every_other_day_backward.intervals)
 
         with self.subTest("disjoint intervals"):
             may_jun_jul = self.may + self.jun + self.jul
@@ -324,6 +340,114 @@ class TestDateRange(TestCase):
             self.assertEqual(self.aug_sep, self.aug | self.sep)
             self.assertEqual(self.aug_sep_oct, self.aug | self.sep + self.oct)
 
+    def test_union_all(self):
+        self.assertEqual(self.no_time, DateRange.union_all([]))
+        self.assertEqual(self.aug, DateRange.union_all([self.aug]))
+        self.assertEqual(self.jul_aug_sep, DateRange.union_all([self.sep, self.jul, self.aug]))
+        self.assertEqual(self.jul_aug_sep, DateRange.union_all(iter([self.aug_sep, self.jul_aug, self.aug15])))
+        self.assertEqual(self.aug, DateRange.union_all([self.no_time, self.aug, self.no_time]))
+        self.assertEqual(self.all_time, DateRange.union_all([self.to_aug, self.aug, self.from_aug]))
+        self.assertEqual(self.may + self.jul + self.sep, DateRange.union_all([self.sep, self.may, self.jul]))
+        with self.assertRaises(TypeError):
+            DateRange.union_all([self.aug, None])
+
+        rng = random.Random(5)
+        ranges = [random_range(rng, rng.randint(0, 15)) for _ in range(30)]
+        expected = DateRange()
+        for _range in ranges:
+            expected += _range
+        self.assertEqual(expected, DateRange.union_all(ranges))
+
+    def test_intersect_all(self):
+        self.assertEqual(self.all_time, DateRange.intersect_all([]))
+        self.assertEqual(self.aug, DateRange.intersect_all([self.aug]))
+        self.assertEqual(self.aug, DateRange.intersect_all([self.jul_aug, self.aug_sep, self.jun_jul_aug + self.oct]))
+        self.assertEqual(self.no_time, DateRange.intersect_all([self.jul_aug, self.aug_sep, self.sep_oct]))
+        self.assertEqual(self.aug15, DateRange.intersect_all([self.jul_aug, self.aug15, self.aug_sep]))
+        self.assertEqual(self.aug, DateRange.intersect_all([self.all_time, self.aug]))
+
+        rng = random.Random(6)
+        ranges = [random_range(rng, 40, span=200) for _ in range(4)]
+        expected = ranges[0] & ranges[1] & ranges[2] & ranges[3]
+        self.assertEqual(expected, DateRange.intersect_all(ranges))
+
+    def test_coverage_at_least(self):
+        ranges = [self.jun_jul_aug, self.jul_aug_sep, self.aug_sep_oct, self.nov]
+        self.assertEqual(self.jun_jul_aug + self.sep_oct_nov, DateRange.coverage_at_least(ranges, 1))
+        self.assertEqual(self.jul_aug_sep, DateRange.coverage_at_least(ranges, 2))
+        self.assertEqual(self.aug, DateRange.coverage_at_least(ranges, 3))
+        self.assertEqual(self.no_time, DateRange.coverage_at_least(ranges, 4))
+        self.assertEqual(self.no_time, DateRange.coverage_at_least([], 1))
+        with self.assertRaises(ValueError):
+            DateRange.coverage_at_least(ranges, 0)
+
+        rng = random.Random(8)
+        ranges = [random_range(rng, 20, span=100) for _ in range(6)]
+        day_sets = [day_set(_range) for _range in ranges]
+        for k in range(1, 7):
+            expected = {day for day in set().union(*day_sets) if sum(day in days for days in day_sets) >= k}
+            self.assertEqual(expected, day_set(DateRange.coverage_at_least(ranges, k)))
+
+    def test_depth_profile(self):
+        self.assertEqual([], list(DateRange.depth_profile([])))
+        self.assertEqual([(self.i_jun, 1), (self.i_jul, 2), (self.i_aug, 3), (self.i_sep, 2), (self.i_oct, 1)],
+                         list(DateRange.depth_profile([self.jun_jul_aug, self.jul_aug_sep, self.aug_sep_oct])))
+        # Ranges that butt against one another keep the same count
+        self.assertEqual([(self.i_jun_jul, 1), (self.i_aug, 2)],
+                         list(DateRange.depth_profile([self.jun, self.jul_aug, self.aug])))
+        self.assertEqual([(self.i_jul, 1), (self.i_sep, 1)], list(DateRange.depth_profile([self.jul, self.sep])))
+
+    def test_complement(self):
+        self.assertEqual(self.all_time, ~self.no_time)
+        self.assertEqual(self.no_time, ~self.all_time)
+        self.assertEqual(self.not_aug, ~self.aug)
+        self.assertEqual(self.aug, ~self.not_aug)
+        self.assertEqual(self.from_aug, ~self.to_aug)
+        self.assertEqual(self.aug + self.oct, ~self.not_aug_oct)
+        self.assertEqual(self.every_other_day_jun_jul, ~~self.every_other_day_jun_jul)
+        self.assertEqual(15, len(~self.every_other_day_jun - DateRange(None, date(2021, 5, 31)) - self.jul_aug_sep - self.from_aug))
+
+        self.assertEqual(self.jul + self.sep, self.aug.complement(within=self.jul_aug_sep))
+        self.assertEqual(self.jul_aug_sep, self.oct.complement(within=self.jul_aug_sep))
+        self.assertEqual(self.no_time, self.year.complement(within=self.jul_aug_sep))
+        self.assertEqual(self.no_time, self.aug.complement(within=self.aug15))
+        self.assertEqual(self.aug15, self.sep.complement(within=self.aug15))
+        self.assertEqual(self.no_time, self.aug.complement(within=self.no_time))
+        self.assertEqual(15, self.every_other_day_jun.complement(within=self.jun).days)
+
+        rng = random.Random(9)
+        for _ in range(50):
+            left = random_range(rng, rng.randint(0, 20))
+            window = random_range(rng, rng.randint(0, 3))
+            self.assertEqual(window - left, left.complement(within=window))
+            self.assertEqual(self.all_time, left | ~left)
+            self.assertEqual(self.no_time, left & ~left)
+
+    def test_symmetric_difference(self):
+        self.assertEqual(self.no_time, self.aug ^ self.aug)
+        self.assertEqual(self.aug, self.aug ^ self.no_time)
+        self.assertEqual(self.aug_sep, self.aug ^ self.sep)
+        self.assertEqual(self.jul + self.sep, self.jul_aug ^ self.aug_sep)
+        self.assertEqual(self.jul + self.sep, self.jul_aug_sep ^ self.aug)
+        self.assertEqual(self.jun + self.aug, self.jun_jul_aug ^ self.jul)
+        self.assertEqual(self.jun + self.sep_oct, (self.jun_jul + self.sep) ^ self.jul_aug.symmetric_difference(self.aug + self.oct))
+        self.assertEqual(self.aug - self.aug15, self.aug ^ self.aug15)
+        self.assertEqual(self.aug - self.aug15, self.aug15 ^ self.aug)
+        self.assertEqual(self.aug, ~self.aug ^ self.all_time)
+        self.assertEqual(self.every_other_day_jun + self.every_other_day_jul,
+                         self.every_other_day_jun ^ self.every_other_day_jul)
+
+        test_range = self.jul_aug.copy()
+        test_range ^= self.aug_sep
+        self.assertEqual(self.jul + self.sep, test_range)
+
+        rng = random.Random(10)
+        for _ in range(200):
+            left = random_range(rng, rng.randint(0, 20))
+            right = random_range(rng, rng.randint(0, 20))
+            self.assertEqual(day_set(left) ^ day_set(right), day_set(left ^ right))
+            self.assertEqual((left - right) + (right - left), left ^ right)
+
     def test_intersect(self):
         self.assertEqual(self.aug, self.aug & self.aug)
 
@@ -368,11 +492,80 @@ class TestDateRange(TestCase):
 
     def test_copy(self):
         self.assertIsNot(self.aug, self.aug.copy())
-        self.assertIsNot(self.aug._intervals[0], self.aug.copy()._intervals[0])
+        self.assertIsNot(self.aug._starts, self.aug.copy()._starts)
+        self.assertIsNot(self.aug._ends, self.aug.copy()._ends)
+
+    def test_ordinal_storage(self):
+        self.assertIsInstance(self.every_other_day_jun._starts, array)
+        self.assertEqual(15, len(self.every_other_day_jun._starts))
+        self.assertEqual(15, len(self.every_other_day_jun.intervals))
+        self.assertEqual(DateRange.Interval(date(2021, 6, 3), date(2021, 6, 3)), self.every_other_day_jun.intervals[1])
+        self.assertEqual([DateRange.Interval(date.min, date(2021, 7, 31)), DateRange.Interval(date(2021, 9, 1), date.max)],
+                         self.not_aug.intervals)
+        self.assertEqual(15, self.every_other_day_jun.days)
+        self.assertEqual(date.max - date(2021, 8, 1), self.from_aug.intervals[0].delta())
+
+        # The intervals are built on access so changing them does not change the range
+        self.aug.intervals[0].end = date(2021, 9, 30)
+        self.assertEqual(31, self.aug.days)
+
+    def test_random_set_operations(self):
+        rng = random.Random(1234)
+        for _ in range(200):
+            left = random_range(rng, rng.randint(0, 20))
+            right = random_range(rng, rng.randint(0, 20))
+            left_days, right_days = day_set(left), day_set(right)
+            self.assertEqual(left_days | right_days, day_set(left | right))
+            self.assertEqual(left_days & right_days, day_set(left & right))
+            self.assertEqual(left_days - right_days, day_set(left - right))
+            self.assertEqual(left_days >= right_days, right in left)
+            self.assertEqual(len(left_days), left.days)
+            # Results are always coalesced
+            self.assertEqual(left | right, right | left)
+            self.assertEqual(len(left - right), len((left - right) + DateRange()))
+
+    def test_operator_allocations(self):
+        first = date(2000, 1, 1).toordinal()
+        left = DateRange.from_list([date.fromordinal(day) for day in range(first, first + 15000, 3)])
+        right = DateRange.from_list([date.fromordinal(day) for day in range(first + 1, first + 15000, 3)])
+        left_copy, right_copy = left.copy(), right.copy()
+        operand_intervals = len(left) + len(right)
+        for operator in ('__or__', '__and__', '__sub__'):
+            # These ranges are fragmented enough for bitmaps, this checks the interval arrays
+            with self.subTest(operator), patch.object(daterange, '_BITMAP_MIN_INTERVALS', len(left) + 1):
+                tracemalloc.start()
+                try:
+                    result = getattr(left, operator)(right)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                # Two int32 arrays for the result and no per interval objects or operand copies
+                self.assertLess(peak, 8 * len(result) * 1.2 + 2048)
+                self.assertLess(peak, 10 * operand_intervals)
+                self.assertEqual(left_copy, left)
+                self.assertEqual(right_copy, right)
 
-    @skip
     def test_from_list(self):
-        raise AssertionError("TODO")
+        self.assertEqual(self.no_time, DateRange.from_list([]))
+        self.assertEqual(self.aug, DateRange.from_list([self.aug]))
+        self.assertEqual(self.aug15, DateRange.from_list([self.aug15, self.aug15]))
+        self.assertEqual(self.jul_aug_sep, DateRange.from_list([self.sep, self.i_jul, self.aug]))
+        self.assertEqual(self.jul_aug_sep, DateRange.from_list(iter([self.i_aug_sep, (date(2021, 7, 1), date(2021, 7, 31))])))
+        self.assertEqual(self.not_aug, DateRange.from_list([(date(2021, 9, 1), date(2021, 7, 31))]))
+        self.assertEqual(self.to_aug, DateRange.from_list([(None, date(2021, 7, 31)), (None, None)]))
+        self.assertEqual(self.every_other_day_jun_jul,
+                         DateRange.from_list(reversed(list(self.every_other_day_jun_jul.intervals))))
+        self.assertEqual(self.may + self.jul_aug + self.oct,
+                         DateRange.from_list([self.oct, self.aug, self.may, self.i_jul, date(2021, 8, 15)]))
+        with self.assertRaises(TypeError):
+            DateRange.from_list([self.aug, "2021-09-01"])
+
+        rng = random.Random(99)
+        days = [date.fromordinal(737000 + rng.randint(0, 500)) for _ in range(300)]
+        expected = DateRange()
+        for day in days:
+            expected += day
+        self.assertEqual(expected, DateRange.from_list(days))
 
     def test_in(self):
         self.assertIn(self.aug15, self.aug)
@@ -396,6 +589,276 @@ class TestDateRange(TestCase):
         self.assertIn(self.every_other_day_jun, self.every_other_day_jun_jul)
         self.assertIn(self.every_other_day_jul, self.every_other_day_jun_jul)
 
+    def test_in_fragmented(self):
+        first = date(2020, 1, 1).toordinal()
+        every_other_day = DateRange()
+        for day in range(first, first + 2000, 2):
+            every_other_day += date.fromordinal(day)
+        for day in range(first - 3, first + 2003):
+            self.assertEqual(first <= day < first + 2000 and (day - first) % 2 == 0,
+                             date.fromordinal(day) in every_other_day)
+
+        sparse_query = DateRange(date.fromordinal(first + 10), date.fromordinal(first + 10))
+        sparse_query += date.fromordinal(first + 1990)
+        self.assertIn(sparse_query, every_other_day)
+        sparse_query += date.fromordinal(first + 1991)
+        self.assertNotIn(sparse_query, every_other_day)
+        self.assertIn(every_other_day, every_other_day)
+        self.assertNotIn(every_other_day + date.fromordinal(first + 1), every_other_day)
+        self.assertIn(every_other_day, DateRange(date.fromordinal(first), date.fromordinal(first + 2000)))
+
+    def test_contains_many(self):
+        days = [date(2021, 6, 30), date(2021, 7, 1), date(2021, 7, 2), date(2021, 8, 15), date(2021, 9, 1)]
+        ranges = self.every_other_day_jul + self.aug
+        with patch.object(daterange, 'np', None):
+            self.assertEqual([False, True, False, True, False], ranges.contains_many(days))
+            self.assertEqual([-1, 0, -1, 15, -1], ranges.locate_many(days))
+            self.assertEqual([False] * 5, self.no_time.contains_many(days))
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_contains_many_numpy(self):
+        days = np.array(['2021-06-30', '2021-07-01', '2021-07-02', '2021-08-15', 'NaT', '2021-09-01'],
+                        dtype='datetime64[D]')
+        ranges = self.every_other_day_jul + self.aug
+        self.assertEqual([False, True, False, True, False, False], ranges.contains_many(days).tolist())
+        self.assertEqual([-1, 0, -1, 15, -1, -1], ranges.locate_many(days).tolist())
+        self.assertEqual([False] * 6, self.no_time.contains_many(days).tolist())
+        self.assertEqual([True] * 5, self.all_time.contains_many(days[days == days]).tolist())
+        self.assertEqual([True, False], self.aug.contains_many([self.aug15, date(2021, 9, 1)]).tolist())
+        self.assertEqual([[False, True]], self.aug.contains_many(days[3:5].astype('datetime64[s]')[::-1][None]).tolist())
+
+        rng = random.Random(7)
+        ranges = random_range(rng, 100)
+        ordinals = [rng.randint(736990, 737420) for _ in range(500)]
+        expected = [date.fromordinal(day) in ranges for day in ordinals]
+        self.assertEqual(expected, ranges.contains_many((np.array(ordinals) - 719163).astype('datetime64[D]')).tolist())
+
+    def test_iter_days(self):
+        self.assertEqual([], list(self.no_time.iter_days()))
+        self.assertEqual([date(2021, 8, day) for day in range(1, 32)], list(self.aug.iter_days()))
+        self.assertEqual(list(self.every_other_day_jun_jul.iter_days()),
+                         [interval.start for interval in self.every_other_day_jun_jul])
+        self.assertEqual([date(2021, 7, 1), date(2021, 7, 11), date(2021, 7, 21), date(2021, 7, 31),
+                          date(2021, 9, 10), date(2021, 9, 20), date(2021, 9, 30)],
+                         list((self.jul + self.sep).iter_days(step=10)))
+        self.assertEqual(list((self.jul + self.sep).iter_days(step=4)),
+                         list((self.jul + self.sep).iter_days(step=4, weekdays=range(7))))
+        mondays = list(self.year.iter_days(weekdays=[0]))
+        self.assertEqual(52, len(mondays))
+        self.assertTrue(all(day.weekday() == 0 for day in mondays))
+        weekends = list((self.aug - self.aug15).iter_days(step=3, weekdays=[5, 6]))
+        self.assertEqual([date(2021, 8, 1), date(2021, 8, 14), date(2021, 8, 28)], weekends)
+        with self.assertRaises(ValueError):
+            next(self.aug.iter_days(step=0))
+
+        # Lazy even for all of time
+        days = self.all_time.iter_days(step=7)
+        self.assertEqual([date.min, date(1, 1, 8)], [next(days), next(days)])
+        self.assertEqual(date(2021, 8, 2), next(self.from_aug.iter_days(weekdays=[0])))
+
+    def test_to_ordinals(self):
+        ranges = self.every_other_day_jun + self.aug + self.sep
+        expected = [day.toordinal() for day in ranges.iter_days()]
+        with patch.object(daterange, 'np', None):
+            self.assertEqual(array('i', expected), ranges.to_ordinals())
+            self.assertEqual(array('i'), self.no_time.to_ordinals())
+            with self.assertRaises(ImportError):
+                ranges.to_datetime64()
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_to_ordinals_numpy(self):
+        ranges = self.every_other_day_jun + self.aug + self.sep + self.from_aug
+        days = ranges.to_ordinals()
+        self.assertEqual(np.int64, days.dtype)
+        self.assertEqual([day.toordinal() for day in (self.every_other_day_jun + self.aug + self.sep).iter_days()],
+                         days[:15 + 31 + 30].tolist())
+        self.assertEqual(ranges.days, len(days))
+        self.assertEqual(date.max.toordinal(), days[-1])
+        self.assertEqual(0, len(self.no_time.to_ordinals()))
+
+        days = (self.jul + self.sep).to_datetime64()
+        self.assertEqual(np.dtype('datetime64[D]'), days.dtype)
+        self.assertEqual(np.datetime64('2021-07-01'), days[0])
+        self.assertEqual(np.datetime64('2021-09-30'), days[-1])
+        self.assertEqual(61, len(days))
+        self.assertTrue((self.jul + self.sep).contains_many(days).all())
+
+    def test_add_and_remove_day(self):
+        date_range = DateRange(date(2021, 8, 1), date(2021, 8, 10)) + DateRange(date(2021, 8, 12), date(2021, 8, 20))
+        date_range.add_day(date(2021, 8, 11))
+        self.assertEqual(DateRange(date(2021, 8, 1), date(2021, 8, 20)), date_range)
+        date_range.add_day(date(2021, 8, 5))
+        date_range.add_day(date(2021, 8, 21))
+        date_range.add_day(date(2021, 7, 31))
+        self.assertEqual(DateRange(date(2021, 7, 31), date(2021, 8, 21)), date_range)
+        date_range.remove_day(date(2021, 8, 10))
+        date_range.remove_day(date(2021, 7, 31))
+        date_range.remove_day(date(2021, 8, 21))
+        date_range.remove_day(date(2021, 9, 1))
+        self.assertEqual(DateRange(date(2021, 8, 1), date(2021, 8, 9)) + DateRange(date(2021, 8, 11), date(2021, 8, 20)),
+                         date_range)
+        date_range.add_interval(date(2021, 7, 1), date(2021, 8, 10))
+        date_range.remove_interval(date(2021, 7, 10), date(2021, 8, 15))
+        self.assertEqual(DateRange(date(2021, 7, 1), date(2021, 7, 9)) + DateRange(date(2021, 8, 16), date(2021, 8, 20)),
+                         date_range)
+        date_range.add_interval(date.min, date.max)
+        self.assertEqual(DateRange.all_time(), date_range)
+        date_range.remove_day(date.min)
+        date_range.remove_day(date.max)
+        self.assertEqual(DateRange(date.min + timedelta(days=1), date.max - timedelta(days=1)), date_range)
+        with self.assertRaises(ValueError):
+            date_range.add_interval(date(2021, 8, 2), date(2021, 8, 1))
+        with self.assertRaises(TypeError):
+            date_range.remove_day('2021-08-01')
+        with self.assertRaises(TypeError):
+            DateRange(date(2021, 8, 1), date(2021, 8, 1)).freeze().add_day(date(2021, 8, 1))
+
+    def test_random_add_and_remove(self):
+        rng = random.Random(20)
+        date_range = random_range(rng, 30)
+        days = day_set(date_range)
+        for _ in range(2000):
+            start = rng.randint(737000, 737410)
+            end = start + rng.choice((0, 0, 0, 1, 5))
+            if rng.random() < 0.5:
+                date_range.add_interval(date.fromordinal(start), date.fromordinal(end))
+                days.update(range(start, end + 1))
+            else:
+                date_range.remove_interval(date.fromordinal(start), date.fromordinal(end))
+                days.difference_update(range(start, end + 1))
+            self.assertEqual(days, day_set(date_range))
+        self.assertEqual(DateRange.from_list(list(date_range)), date_range)
+
+    def test_in_place_day_operators(self):
+        date_range = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        with patch.object(DateRange, '_union') as union, patch.object(DateRange, '_subtract') as subtract:
+            date_range += date(2021, 9, 1)
+            date_range |= DateRange(date(2021, 9, 3), date(2021, 9, 4))
+            date_range -= date(2021, 8, 15)
+            date_range -= DateRange(date(2021, 8, 20), date(2021, 8, 21))
+        union.assert_not_called()
+        subtract.assert_not_called()
+        self.assertEqual(DateRange.from_list([(date(2021, 8, 1), date(2021, 8, 14)), (date(2021, 8, 16), date(2021, 8, 19)),
+                                              (date(2021, 8, 22), date(2021, 9, 1)), (date(2021, 9, 3), date(2021, 9, 4))]),
+                         date_range)
+        with self.assertRaises(TypeError):
+            date_range += '2021-08-01'
+
+    def test_rank_and_select(self):
+        rng = random.Random(21)
+        for count in (0, 1, 5, 60):
+            date_range = random_range(rng, count)
+            days = sorted(day_set(date_range))
+            for n, day in enumerate(days):
+                self.assertEqual(date.fromordinal(day), date_range.nth_day(n))
+                self.assertEqual(date.fromordinal(day), date_range.nth_day(n - len(days)))
+            for day in range(736990, 737420):
+                self.assertEqual(sum(1 for covered in days if covered < day), date_range.rank(date.fromordinal(day)))
+            for _ in range(100):
+                start = rng.randint(736990, 737420)
+                end = start + rng.randint(0, 60)
+                self.assertEqual(sum(1 for covered in days if start <= covered <= end),
+                                 date_range.count_days(date.fromordinal(start), date.fromordinal(end)))
+            for n in (len(days), -len(days) - 1):
+                with self.assertRaises(IndexError):
+                    date_range.nth_day(n)
+        self.assertEqual(DateRange.all_time().days, DateRange.all_time().count_days(date.min, date.max))
+        with self.assertRaises(ValueError):
+            date_range.count_days(date(2021, 8, 2), date(2021, 8, 1))
+
+    def test_rank_after_changes(self):
+        date_range = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        self.assertEqual(date(2021, 8, 31), date_range.nth_day(-1))
+        date_range.add_day(date(2021, 9, 10))
+        self.assertEqual(date(2021, 9, 10), date_range.nth_day(-1))
+        date_range.remove_day(date(2021, 8, 1))
+        self.assertEqual(date(2021, 8, 2), date_range.nth_day(0))
+        date_range |= DateRange(date(2021, 7, 1), date(2021, 7, 2)) + date(2021, 12, 25)
+        self.assertEqual(date(2021, 12, 25), date_range.nth_day(-1))
+        self.assertEqual(34, date_range.days)
+        date_range &= DateRange(date(2021, 8, 1), date(2021, 12, 31))
+        self.assertEqual(31, date_range.rank(date(2021, 12, 25)))
+        date_range -= DateRange(date(2021, 8, 5), date(2021, 8, 6)) + date(2021, 12, 25)
+        self.assertEqual(29, date_range.count_days(date.min, date.max))
+        date_range ^= DateRange(date(2021, 8, 1), date(2021, 8, 3))
+        self.assertEqual(date(2021, 8, 1), date_range.nth_day(0))
+        self.assertEqual(28, date_range.days)
+
+    def test_next_and_prev_day(self):
+        rng = random.Random(22)
+        for count in (0, 1, 40):
+            date_range = random_range(rng, count)
+            days = sorted(day_set(date_range))
+            for day in range(736990, 737420):
+                following = [covered for covered in days if covered >= day]
+                preceding = [covered for covered in days if covered <= day]
+                self.assertEqual(date.fromordinal(following[0]) if following else None,
+                                 date_range.next_day(date.fromordinal(day)))
+                self.assertEqual(date.fromordinal(preceding[-1]) if preceding else None,
+                                 date_range.prev_day(date.fromordinal(day)))
+        self.assertEqual(date.max, DateRange(date(2021, 8, 1), None).next_day(date.max))
+        self.assertEqual(date.min, DateRange(None, date(2021, 8, 1)).prev_day(date.min))
+
+    def test_gaps(self):
+        rng = random.Random(22)
+        date_range = random_range(rng, 40)
+        complement = date_range.complement(DateRange(date_range.earliest, date_range.latest))
+        self.assertEqual(complement.intervals, list(date_range.gaps()))
+        for min_length in (2, 5, 10):
+            self.assertEqual([interval for interval in complement if interval.days >= min_length],
+                             list(date_range.gaps(min_length=min_length)))
+        self.assertEqual([], list(DateRange().gaps()))
+        self.assertEqual([], list(DateRange.all_time().gaps()))
+        self.assertEqual([DateRange.Interval(date(2021, 8, 2), date(2021, 8, 2))],
+                         list(DateRange(date(2021, 8, 3), date(2021, 8, 1)).gaps()))
+
+    def test_find_gap(self):
+        date_range = DateRange.from_list([(date(2021, 8, 1), date(2021, 8, 9)), (date(2021, 8, 12), date(2021, 8, 15)),
+                                          (date(2021, 8, 20), date(2021, 8, 31))])
+        self.assertEqual(DateRange.Interval(date(2021, 8, 10), date(2021, 8, 11)), date_range.find_gap(date(2021, 8, 1), 2))
+        self.assertEqual(DateRange.Interval(date(2021, 8, 16), date(2021, 8, 19)), date_range.find_gap(date(2021, 8, 1), 3))
+        self.assertEqual(DateRange.Interval(date(2021, 8, 11), date(2021, 8, 11)), date_range.find_gap(date(2021, 8, 11), 1))
+        self.assertEqual(DateRange.Interval(date(2021, 8, 17), date(2021, 8, 19)), date_range.find_gap(date(2021, 8, 17), 3))
+        self.assertEqual(DateRange.Interval(date(2021, 9, 1), date.max), date_range.find_gap(date(2021, 8, 17), 4))
+        self.assertEqual(DateRange.Interval(date(2021, 7, 1), date(2021, 7, 31)), date_range.find_gap(date(2021, 7, 1), 31))
+        self.assertIsNone(DateRange(date(2021, 8, 1), None).find_gap(date(2021, 8, 1), 1))
+        self.assertIsNone(DateRange(date(2021, 8, 1), date(2021, 8, 2)).find_gap(date(9999, 12, 30), 3))
+        with self.assertRaises(ValueError):
+            date_range.find_gap(date(2021, 8, 1), 0)
+
+    def test_overlap_measures(self):
+        rng = random.Random(23)
+        ranges = [DateRange(), DateRange.all_time()] + [random_range(rng, count) for count in (1, 3, 10, 50, 200)]
+        ranges.append(random_range(rng, 5, first=738000))
+        for left in ranges:
+            for right in ranges:
+                shared = len(day_set(left) & day_set(right)) if left.days < 10000 and right.days < 10000 \
+                    else (left & right).days
+                self.assertEqual(shared, left.overlap_days(right))
+                self.assertEqual(bool(shared), left.overlaps(right))
+                self.assertEqual(not shared, left.isdisjoint(right))
+                either = left.days + right.days - shared
+                self.assertAlmostEqual(shared / either if either else 1.0, left.jaccard(right))
+        aug = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        self.assertTrue(aug.overlaps(date(2021, 8, 31)))
+        self.assertFalse(aug.overlaps(date(2021, 9, 1)))
+        self.assertEqual(1 / 31, aug.jaccard(date(2021, 8, 5)))
+        with self.assertRaises(TypeError):
+            aug.overlaps('2021-08-01')
+
+    def test_overlaps_allocations(self):
+        rng = random.Random(23)
+        left, right = random_range(rng, 2000, span=20000), random_range(rng, 2000, span=20000)
+        left.overlap_days(right)
+        tracemalloc.start()
+        try:
+            left.overlap_days(right)
+            left.isdisjoint(right)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 2000)
+
     def test_equal(self):
         self.assertEqual(self.aug, self.aug)
         self.assertEqual(DateRange(date(2021, 8, 1), date(2021, 8, 31)), self.aug)
@@ -432,3 +895,779 @@ class TestDateRange(TestCase):
         self.assertTrue(self.aug15 > self.jul)
 
         self.assertFalse(self.aug15 > self.aug)
+
+
+def fragmented_range(rng: random.Random, count: int, first: int = 737000) -> DateRange:
+    """A DateRange of count intervals of one to three days with one to five day gaps"""
+    days = []
+    day = first
+    for _ in range(count):
+        day += rng.randint(1, 5)
+        length = rng.randint(1, 3)
+        days.append((date.fromordinal(day), date.fromordinal(day + length - 1)))
+        day += length
+    return DateRange.from_list(days)
+
+
+def holds_intervals(date_range: DateRange) -> bool:
+    try:
+        object.__getattribute__(date_range, '_starts')
+    except AttributeError:
+        return False
+    return True
+
+
+class TestBitmap(TestCase):
+    operators = ('__or__', '__and__', '__sub__', '__xor__', '__ior__', '__iand__', '__isub__', '__ixor__')
+
+    def setUp(self) -> None:
+        rng = random.Random(25)
+        self.ranges = [fragmented_range(rng, count, first) for count, first in
+                       ((100, 737000), (300, 737100), (1000, 736500), (200, 740000))]
+
+    def interval_results(self, left, right):
+        with patch.object(daterange, '_BITMAP_MIN_INTERVALS', 10 ** 9):
+            return {operator: getattr(left.copy(), operator)(right) for operator in self.operators}
+
+    def assertBitmapResults(self, left, right):
+        expected = self.interval_results(left, right)
+        for operator in self.operators:
+            with self.subTest(operator, left=len(left), right=len(right)):
+                operand = left.copy()
+                result = getattr(operand, operator)(right)
+                self.assertIsNotNone(result._bitmap)
+                self.assertFalse(holds_intervals(result))
+                self.assertEqual(expected[operator].days, result.days)
+                self.assertEqual(expected[operator].earliest, result.earliest)
+                self.assertEqual(expected[operator].latest, result.latest)
+                self.assertEqual(bool(expected[operator]), bool(result))
+                self.assertEqual(expected[operator], result)
+                self.assertEqual(expected[operator].intervals, result.intervals)
+                if operator.startswith('__i'):
+                    self.assertIs(operand, result)
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_operations(self):
+        for left in self.ranges:
+            for right in self.ranges:
+                self.assertBitmapResults(left, right)
+        self.assertBitmapResults(self.ranges[0], DateRange.from_list(list(self.ranges[0])))
+
+    def test_operations_without_numpy(self):
+        expected = self.interval_results(self.ranges[1], self.ranges[2])
+        with patch.object(daterange, 'np', None):
+            for operator in self.operators:
+                with self.subTest(operator):
+                    result = getattr(self.ranges[1].copy(), operator)(self.ranges[2])
+                    self.assertIsNone(result._bitmap)
+                    self.assertEqual(expected[operator].intervals, result.intervals)
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_conversion(self):
+        for date_range in self.ranges + [DateRange(), DateRange(date(2021, 8, 1), date(2021, 8, 1))]:
+            bitmap = daterange._to_bitmap(date_range._starts, date_range._ends)
+            self.assertEqual(date_range.days, bin(bitmap[1]).count('1'))
+            self.assertEqual((date_range._starts, date_range._ends), daterange._from_bitmap(*bitmap))
+            self.assertEqual((date_range.earliest.toordinal(), date_range.latest.toordinal(), len(date_range))
+                             if date_range else (0, -1, 0), DateRange._from_bitmap(bitmap)._extent())
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_combined_span(self):
+        # Each is fragmented on its own but together they span the whole calendar
+        first = DateRange.from_list(date.fromordinal(day) for day in range(1, 200, 2))
+        last = DateRange.from_list(date(9999, 12, 31) - timedelta(days=day) for day in range(0, 200, 2))
+        self.assertTrue(first._fragmented() and last._fragmented())
+        for operator in self.operators:
+            with self.subTest(operator):
+                result = getattr(first.copy(), operator)(last)
+                self.assertIsNone(result._bitmap)
+                self.assertTrue(holds_intervals(result))
+        union = first | last
+        self.assertEqual(200, len(union))
+
+        # A bitmap held from an earlier operation does not extend the span either
+        bitmap_only = first | first.copy()
+        self.assertFalse(holds_intervals(bitmap_only))
+        self.assertEqual(100, bitmap_only._extent()[2])
+        result = bitmap_only | last
+        self.assertIsNone(result._bitmap)
+        self.assertEqual(union, result)
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_switching(self):
+        left, right = self.ranges[1], self.ranges[2]
+        self.assertIsNone((left | DateRange(date(2021, 8, 1), date(2021, 8, 31)))._bitmap)
+        self.assertIsNone((left | DateRange.all_time())._bitmap)
+        union = left | right
+        self.assertFalse(holds_intervals(union))
+        days = sorted(day_set(left) | day_set(right))
+        for day in range(days[0] - 3, days[-1] + 3):
+            self.assertEqual(day in days, date.fromordinal(day) in union)
+        self.assertFalse(holds_intervals(union))
+        self.assertEqual(len(days), union.overlap_days(union))
+
+        # Changing a range in place drops its bitmap
+        union.add_day(date.fromordinal(days[0] - 2))
+        self.assertIsNone(union._bitmap)
+        self.assertEqual(date.fromordinal(days[0] - 2), union.earliest)
+        self.assertEqual(len(days) + 1, union.days)
+        union &= DateRange(date.fromordinal(days[0]), date.fromordinal(days[-1]))
+        self.assertIsNone(union._bitmap)
+        self.assertEqual(len(days), union.days)
+
+        frozen = left.freeze() | right
+        self.assertIsInstance(frozen, FrozenDateRange)
+        self.assertEqual(hash((left | right).freeze()), hash(frozen))
+        self.assertEqual(left | right, pickle.loads(pickle.dumps(left | right)))
+
+
+class TestFrozenDateRange(TestCase):
+    def setUp(self) -> None:
+        self.aug = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        self.sep = DateRange(date(2021, 9, 1), date(2021, 9, 30))
+        self.frozen_aug = FrozenDateRange(date(2021, 8, 1), date(2021, 8, 31))
+
+    def test_hash(self):
+        self.assertEqual(hash(self.frozen_aug), hash(self.aug.freeze()))
+        self.assertEqual({self.frozen_aug: 1}, {self.aug.freeze(): 1})
+        self.assertEqual(2, len({self.frozen_aug, self.aug.freeze(), (self.aug + self.sep).freeze()}))
+        self.assertEqual(self.aug, self.frozen_aug)
+        self.assertEqual(self.frozen_aug, self.aug)
+        with self.assertRaises(TypeError):
+            hash(self.aug)
+
+    def test_cached_properties(self):
+        frozen = (self.aug + self.sep + date(2021, 12, 25)).freeze()
+        self.assertEqual(62, frozen.days)
+        self.assertEqual(62, frozen.days)
+        self.assertEqual(date(2021, 8, 1), frozen.earliest)
+        self.assertEqual(date(2021, 12, 25), frozen.latest)
+        self.assertIsNone(FrozenDateRange().earliest)
+        self.assertEqual(0, FrozenDateRange().days)
+
+    def test_immutable(self):
+        frozen = self.frozen_aug
+        frozen |= self.sep
+        self.assertEqual(self.aug + self.sep, frozen)
+        self.assertIsInstance(frozen, FrozenDateRange)
+        self.assertEqual(self.aug, self.frozen_aug)
+        self.assertEqual(31, self.frozen_aug.days)
+
+        frozen = self.frozen_aug
+        frozen -= date(2021, 8, 15)
+        frozen &= DateRange(date(2021, 8, 10), date(2021, 8, 20))
+        self.assertEqual(10, frozen.days)
+        self.assertEqual(self.aug, self.frozen_aug)
+
+        frozen = self.frozen_aug
+        frozen ^= self.sep
+        self.assertEqual(self.aug + self.sep, frozen)
+        self.assertEqual(self.aug, self.frozen_aug)
+
+        self.assertIsInstance(self.frozen_aug | self.sep, FrozenDateRange)
+        self.assertIsInstance(self.sep | self.frozen_aug, DateRange)
+        self.assertNotIsInstance(self.sep | self.frozen_aug, FrozenDateRange)
+
+    def test_freeze_and_thaw(self):
+        frozen = self.aug.freeze()
+        self.aug += self.sep
+        self.assertEqual(31, frozen.days)
+        self.assertIs(frozen, frozen.freeze())
+
+        thawed = frozen.thaw()
+        self.assertNotIsInstance(thawed, FrozenDateRange)
+        thawed += self.sep
+        self.assertEqual(61, thawed.days)
+        self.assertEqual(31, frozen.days)
+        self.assertEqual("FrozenDateRange[1](2021-08-01, 2021-08-31)", repr(frozen))
+        self.assertIsInstance(FrozenDateRange.from_list([self.aug, self.sep]), FrozenDateRange)
+
+
+class TestLazyDateRange(TestCase):
+    def setUp(self) -> None:
+        self.jul = DateRange(date(2021, 7, 1), date(2021, 7, 31))
+        self.aug = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        self.sep = DateRange(date(2021, 9, 1), date(2021, 9, 30))
+        self.aug15 = date(2021, 8, 15)
+
+    def test_operators(self):
+        self.assertIsInstance(self.jul | self.aug.lazy(), LazyDateRange)
+        self.assertIsInstance(date(2021, 1, 1) - self.aug.lazy(), LazyDateRange)
+        self.assertEqual(self.jul + self.aug + self.sep, (self.jul.lazy() | self.aug | self.sep).evaluate())
+        self.assertEqual(self.aug, (self.jul.lazy() + self.aug + self.sep & self.aug).evaluate())
+        self.assertEqual(self.aug - self.aug15, (self.aug.lazy() - self.aug15).evaluate())
+        self.assertEqual(self.jul + self.sep, (self.jul.lazy() ^ (self.aug + self.sep) ^ self.aug).evaluate())
+        self.assertEqual(~self.aug, (~self.aug.lazy()).evaluate())
+        self.assertEqual(self.aug, (~~self.aug.lazy()).evaluate())
+        self.assertEqual(self.aug, (self.aug & self.aug.lazy()).evaluate())
+        self.assertEqual(DateRange(), (self.aug - self.aug.lazy()).evaluate())
+        self.assertEqual(self.jul + self.aug, (self.jul | self.aug.lazy()).evaluate())
+        self.assertEqual(self.sep, (self.sep ^ DateRange().lazy()).evaluate())
+        self.assertEqual(DateRange(), (self.jul.lazy() & self.aug & self.sep).evaluate())
+        self.assertEqual(DateRange(self.aug15, self.aug15), (self.aug15 & self.aug.lazy()).evaluate())
+        with self.assertRaises(TypeError):
+            self.aug.lazy() | "2021-09-01"
+
+    def test_forcing(self):
+        expression = (self.jul.lazy() | self.aug | self.sep) - self.aug15
+        self.assertEqual(91, expression.days)
+        self.assertEqual([DateRange.Interval(date(2021, 7, 1), date(2021, 8, 14)),
+                          DateRange.Interval(date(2021, 8, 16), date(2021, 9, 30))], list(expression))
+        self.assertIn(date(2021, 8, 14), expression)
+        self.assertNotIn(self.aug15, expression)
+        self.assertNotIn(date(2021, 10, 1), expression)
+        self.assertIn(self.jul, expression)
+        self.assertNotIn(self.aug, expression)
+        self.assertIn(self.jul.lazy() | self.sep, expression)
+        with self.assertRaises(TypeError):
+            "2021-08-01" in expression
+        self.assertTrue(expression)
+        self.assertFalse(self.jul.lazy() & self.aug)
+        self.assertFalse(self.aug.lazy() - self.aug)
+        self.assertTrue(~DateRange().lazy())
+
+        # The leaves are read when the expression is forced
+        self.jul += date(2021, 6, 30)
+        self.assertEqual(92, expression.days)
+
+    def test_explain(self):
+        expression = (self.jul.lazy() | self.aug | self.sep) & ~self.aug.lazy() & self.jul
+        self.assertEqual(self.jul, expression.evaluate())
+        self.assertEqual("intersect of 3: chained merges\n"
+                         "  union of 3: heap merge then coalesce\n"
+                         "    DateRange[1](2021-07-01, 2021-07-31)\n"
+                         "    DateRange[1](2021-08-01, 2021-08-31)\n"
+                         "    DateRange[1](2021-09-01, 2021-09-30)\n"
+                         "  complement: stream the gaps\n"
+                         "    DateRange[1](2021-08-01, 2021-08-31)\n"
+                         "  DateRange[1](2021-07-01, 2021-07-31)", expression.explain())
+
+    def test_random_expressions(self):
+        rng = random.Random(11)
+        for _ in range(100):
+            a, b, c, d = (random_range(rng, rng.randint(0, 15)) for _ in range(4))
+            self.assertEqual((a | b | c) & d - b, ((a.lazy() | b | c) & (d.lazy() - b)).evaluate())
+            self.assertEqual((a ^ b) - (c & ~d), ((a.lazy() ^ b) - (c.lazy() & ~d.lazy())).evaluate())
+            self.assertEqual(((a | b) & c).days, ((a.lazy() | b) & c).days)
+
+
+class TestRecurringDateRange(TestCase):
+    def setUp(self) -> None:
+        start, end = date(2021, 1, 1), date(2023, 12, 31)
+        self.window = range(start.toordinal() - 10, end.toordinal() + 11)
+        self.rules = {
+            'weekdays': (RecurringDateRange.weekdays(start, end), lambda day: day.weekday() < 5),
+            'mondays': (RecurringDateRange.weekdays(start, end, [0]), lambda day: day.weekday() == 0),
+            'every 10': (RecurringDateRange.every(start, end, 10), lambda day: (day - start).days % 10 == 0),
+            'monthly': (RecurringDateRange.monthly(start, end, [1, 15, 31, -1]),
+                        lambda day: day.day in (1, 15, 31) or (day + timedelta(days=1)).day == 1),
+            'anchored': (RecurringDateRange(date(2021, 1, 3), end, 5, [3, 4, 0], anchor=date(2020, 12, 30)),
+                         lambda day: (day - date(2020, 12, 30)).days % 5 in (0, 3, 4)),
+            'nothing': (RecurringDateRange(start, end, 3, []), lambda day: False),
+        }
+
+    def expected(self, name):
+        recurring, rule = self.rules[name]
+        return DateRange.from_list([day for day in map(date.fromordinal, self.window)
+                                    if recurring._start <= day.toordinal() <= recurring._end and rule(day)])
+
+    def test_rules(self):
+        for name, (recurring, _) in self.rules.items():
+            with self.subTest(name):
+                expected = self.expected(name)
+                self.assertEqual(expected, recurring.to_date_range())
+                self.assertEqual(expected.intervals, list(recurring))
+                self.assertEqual(expected.days, recurring.days)
+                self.assertEqual(expected.earliest, recurring.earliest)
+                self.assertEqual(expected.latest, recurring.latest)
+                for day in map(date.fromordinal, self.window):
+                    self.assertEqual(day in expected, day in recurring)
+
+    def test_set_operations(self):
+        rng = random.Random(24)
+        others = [DateRange(), DateRange.all_time(), DateRange(date(2020, 12, 1), date(2021, 2, 1)),
+                  random_range(rng, 40, first=date(2020, 12, 20).toordinal(), span=1200)]
+        for name, (recurring, _) in self.rules.items():
+            expected = self.expected(name)
+            for other in others:
+                with self.subTest(name, other=len(other)):
+                    self.assertEqual(expected & other, recurring & other)
+                    self.assertEqual(expected & other, other & recurring)
+                    self.assertEqual(expected | other, recurring | other)
+                    self.assertEqual(expected | other, other + recurring)
+                    self.assertEqual(expected - other, recurring - other)
+                    self.assertEqual(other - expected, other - recurring)
+                    self.assertEqual(expected ^ other, recurring ^ other)
+                    self.assertEqual(expected ^ other, other ^ recurring)
+                    self.assertEqual(expected in other, recurring in other)
+                    self.assertEqual(other in expected, other in recurring)
+        weekdays = self.rules['weekdays'][0]
+        self.assertIsInstance(weekdays & others[2].freeze(), FrozenDateRange)
+        self.assertEqual(DateRange(date(2021, 1, 1), date(2021, 1, 1)), weekdays & date(2021, 1, 1))
+        date_range = DateRange(date(2021, 1, 1), date(2021, 1, 10))
+        date_range -= weekdays
+        self.assertEqual(DateRange.from_list([(date(2021, 1, 2), date(2021, 1, 3)), (date(2021, 1, 9), date(2021, 1, 10))]),
+                         date_range)
+
+    def test_contains_outside_window(self):
+        every_day = RecurringDateRange.every(date(2021, 8, 1), date(2021, 8, 10), 1)
+        self.assertNotIn(DateRange(date(2021, 9, 1), date(2021, 9, 5)), every_day)
+        self.assertNotIn(DateRange(date(2021, 7, 31), date(2021, 8, 5)), every_day)
+        self.assertIn(DateRange(date(2021, 8, 1), date(2021, 8, 10)), every_day)
+        weekdays = RecurringDateRange.weekdays(date(2021, 8, 2), date(2021, 8, 6))
+        self.assertNotIn(DateRange(date(2021, 8, 9), date(2021, 8, 13)), weekdays)
+        self.assertNotIn(DateRange(date(2021, 7, 26), date(2021, 7, 26)) + date(2021, 8, 3), weekdays)
+        self.assertIn(DateRange(date(2021, 8, 3), date(2021, 8, 5)), weekdays)
+        self.assertIn(DateRange(), weekdays)
+
+    def test_other_types(self):
+        weekdays = self.rules['weekdays'][0]
+        with self.assertRaises(TypeError):
+            'x' in weekdays
+        for operator_function in (operator.and_, operator.or_, operator.sub, operator.xor):
+            with self.assertRaises(TypeError):
+                operator_function(weekdays, 'x')
+            with self.assertRaises(TypeError):
+                operator_function('x', weekdays)
+        self.assertIs(NotImplemented, weekdays.__and__('x'))
+        self.assertIs(NotImplemented, weekdays.__rsub__(1))
+
+    def test_long_rule(self):
+        weekdays = RecurringDateRange.weekdays(date(1990, 1, 1), date(9999, 12, 31))
+        days = DateRange(date(1990, 1, 1), date(9999, 12, 31)).days
+        self.assertEqual(0, date(1990, 1, 1).weekday())
+        self.assertEqual(days // 7 * 5 + min(days % 7, 5), weekdays.days)
+        window = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        self.assertEqual(22, (weekdays & window).days)
+        self.assertEqual(date(9999, 12, 31), weekdays.latest)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            RecurringDateRange(date(2021, 1, 1), date(2021, 12, 31), 0)
+        with self.assertRaises(ValueError):
+            RecurringDateRange(date(2021, 1, 1), date(2021, 12, 31), 7, [7])
+        with self.assertRaises(ValueError):
+            RecurringDateRange.weekdays(date(2021, 1, 1), date(2021, 12, 31), [7])
+        with self.assertRaises(ValueError):
+            RecurringDateRange.monthly(date(2021, 1, 1), date(2021, 12, 31), [0])
+        with self.assertRaises(ValueError):
+            RecurringDateRange(date(2021, 12, 31), date(2021, 1, 1), 7)
+
+
+class TestDateRangeBuilder(TestCase):
+    def test_build(self):
+        builder = DateRangeBuilder(chunk_size=4)
+        self.assertEqual(DateRange(), builder.build())
+        builder.add(date(2021, 8, 15))
+        builder.add(DateRange.Interval(date(2021, 8, 1), date(2021, 8, 10)))
+        builder.extend([(date(2021, 8, 11), date(2021, 8, 14)), DateRange(date(2021, 9, 1), date(2021, 9, 30))])
+        builder.add(date(2021, 7, 31))
+        self.assertEqual(DateRange(date(2021, 7, 31), date(2021, 8, 15)) + DateRange(date(2021, 9, 1), date(2021, 9, 30)),
+                         builder.build())
+        # Building does not stop more items being added
+        built = builder.build()
+        builder.add(date(2021, 8, 16))
+        self.assertEqual(2, len(built))
+        self.assertEqual(47, builder.build().days)
+        with self.assertRaises(TypeError):
+            builder.add("2021-08-17")
+        with self.assertRaises(ValueError):
+            DateRangeBuilder(chunk_size=0)
+
+    def test_random_order(self):
+        rng = random.Random(12)
+        days = [date.fromordinal(737000 + rng.randint(0, 1000)) for _ in range(2000)]
+        for chunk_size in (1, 7, 100, 65536):
+            builder = DateRangeBuilder(chunk_size=chunk_size)
+            builder.extend(days)
+            self.assertEqual(DateRange.from_list(days), builder.build())
+
+    def test_coalesce_sorted(self):
+        self.assertEqual([], list(DateRangeBuilder.coalesce_sorted([])))
+        items = [date(2021, 8, 1), date(2021, 8, 1), date(2021, 8, 2),
+                 DateRange.Interval(date(2021, 8, 2), date(2021, 8, 5)), date(2021, 8, 4),
+                 (date(2021, 8, 7), date(2021, 8, 8)), DateRange(date(2021, 8, 9), date(2021, 8, 9)),
+                 date(2021, 8, 20)]
+        self.assertEqual([DateRange.Interval(date(2021, 8, 1), date(2021, 8, 5)),
+                          DateRange.Interval(date(2021, 8, 7), date(2021, 8, 9)),
+                          DateRange.Interval(date(2021, 8, 20), date(2021, 8, 20))],
+                         list(DateRangeBuilder.coalesce_sorted(items)))
+
+        # Finished intervals are yielded before the rest of the stream is read
+        def stream():
+            yield date(2021, 8, 1)
+            yield date(2021, 8, 3)
+            raise AssertionError("read too far")
+        self.assertEqual(DateRange.Interval(date(2021, 8, 1), date(2021, 8, 1)),
+                         next(DateRangeBuilder.coalesce_sorted(stream())))
+
+        with self.assertRaises(ValueError):
+            list(DateRangeBuilder.coalesce_sorted([date(2021, 8, 2), date(2021, 8, 1)]))
+
+
+class TestDateRangeIndex(TestCase):
+    def setUp(self) -> None:
+        self.aug = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        self.sep = DateRange(date(2021, 9, 1), date(2021, 9, 30))
+        self.aug15 = date(2021, 8, 15)
+
+    def test_queries(self):
+        index = DateRangeIndex([('aug', self.aug), ('sep', self.sep), ('aug_sep', self.aug + self.sep),
+                                ('15th', self.aug15), ('not_aug', ~self.aug)])
+        self.assertEqual(5, len(index))
+        self.assertIn('aug', index)
+        self.assertEqual(self.aug, index['aug'])
+        self.assertEqual({'aug', 'aug_sep', '15th'}, set(index.stab(self.aug15)))
+        self.assertEqual({'aug', 'aug_sep'}, set(index.stab(date(2021, 8, 31))))
+        self.assertEqual({'not_aug'}, set(index.stab(date.max)))
+        self.assertEqual({'not_aug'}, set(index.stab(date(2021, 7, 31))))
+        self.assertEqual({'aug', 'sep', 'aug_sep', 'not_aug'}, set(index.overlapping(DateRange(date(2021, 8, 31), date(2021, 9, 1)))))
+        self.assertEqual(['not_aug'], index.overlapping(DateRange(date(2020, 1, 1), date(2020, 1, 1))))
+        self.assertEqual(4, len(index.overlapping(DateRange.from_list([self.aug15, date(2021, 10, 1)]))))
+        self.assertEqual([['15th', 'aug', 'aug_sep'], ['not_aug']],
+                         [sorted(keys) for keys in index.stab_many([self.aug15, date(2022, 1, 1)])])
+        self.assertEqual([], DateRangeIndex().stab(self.aug15))
+        self.assertEqual([], DateRangeIndex().overlapping(self.aug))
+
+    def test_insert_and_delete(self):
+        index = DateRangeIndex({'aug': self.aug})
+        self.assertEqual(['aug'], index.stab(self.aug15))
+        index.insert('aug', self.sep)
+        self.assertEqual([], index.stab(self.aug15))
+        self.assertEqual(['aug'], index.stab(date(2021, 9, 15)))
+        index.delete('aug')
+        self.assertEqual([], index.stab(date(2021, 9, 15)))
+        self.assertNotIn('aug', index)
+        with self.assertRaises(KeyError):
+            index.delete('aug')
+
+        # Ranges are frozen when indexed
+        added = self.aug.copy()
+        index.insert('added', added)
+        added += self.sep
+        self.assertEqual([], index.stab(date(2021, 9, 15)))
+
+    def test_random(self):
+        rng = random.Random(14)
+        index = DateRangeIndex()
+        ranges = {}
+        for step in range(1500):
+            key = rng.randint(0, 400)
+            if key in ranges and rng.random() < 0.3:
+                index.delete(key)
+                del ranges[key]
+            else:
+                ranges[key] = random_range(rng, rng.randint(0, 4), span=300)
+                index.insert(key, ranges[key])
+            if step % 100 == 0:
+                for _ in range(20):
+                    day = date.fromordinal(rng.randint(736990, 737320))
+                    self.assertEqual({key for key, _range in ranges.items() if day in _range}, set(index.stab(day)))
+                    window = random_range(rng, 2, span=300)
+                    self.assertEqual({key for key, _range in ranges.items() if _range & window},
+                                     set(index.overlapping(window)))
+                    self.assertEqual(len(set(index.overlapping(window))), len(index.overlapping(window)))
+        self.assertEqual(len(ranges), len(index))
+
+    def test_empty_ranges(self):
+        index = DateRangeIndex((key, DateRange()) for key in range(1000))
+        index.insert('aug', self.aug)
+        self.assertEqual(['aug'], index.stab(self.aug15))
+        self.assertEqual(['aug'], index.overlapping(self.aug))
+        self.assertEqual({'aug': self.aug}, index._pending)
+        self.assertEqual(1001, len(index))
+        index.delete(0)
+        index.insert('aug', DateRange())
+        self.assertEqual([], index.stab(self.aug15))
+        self.assertEqual(DateRange(), index['aug'])
+        self.assertEqual(1000, len(index))
+
+    def test_interleaved_queries(self):
+        rng = random.Random(140)
+        index = DateRangeIndex()
+        ranges = {}
+        for step in range(3000):
+            key = rng.randint(0, 1500)
+            if key in ranges and rng.random() < 0.2:
+                index.delete(key)
+                del ranges[key]
+            else:
+                ranges[key] = random_range(rng, rng.randint(1, 3), span=600)
+                index.insert(key, ranges[key])
+            day = date.fromordinal(rng.randint(736990, 737620))
+            self.assertEqual({key for key, _range in ranges.items() if day in _range}, set(index.stab(day)))
+            # The buffer stays small and every tree is more than twice the size of the next
+            self.assertLess(index._pending_size, DateRangeIndex._rebuild_minimum)
+            sizes = [tree.size for tree in index._trees]
+            self.assertTrue(all(larger > 2 * smaller for larger, smaller in zip(sizes, sizes[1:])), sizes)
+            if step % 50 == 0:
+                window = random_range(rng, 2, span=600)
+                self.assertEqual({key for key, _range in ranges.items() if _range & window},
+                                 set(index.overlapping(window)))
+        self.assertEqual(sum(map(len, ranges.values())),
+                         index._tree_size - index._stale_size + index._pending_size)
+
+
+class TestSerialization(TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(17)
+        self.ranges = [random_range(rng, 50), DateRange(), DateRange.all_time(), DateRange(date(2021, 9, 1), date(2021, 8, 1)),
+                       random_range(rng, 3)]
+        self.path = os.path.join(tempfile.mkdtemp(), 'ranges.bin')
+
+    def tearDown(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rmdir(os.path.dirname(self.path))
+
+    def test_bytes(self):
+        for date_range in self.ranges:
+            data = date_range.to_bytes()
+            self.assertEqual(16 + 8 * len(date_range), len(data))
+            decoded = DateRange.from_bytes(data)
+            self.assertEqual(date_range, decoded)
+            self.assertIsInstance(decoded._starts, array)
+            decoded += date(1990, 1, 1)
+            self.assertEqual(date_range, DateRange.from_bytes(bytearray(data)))
+        frozen = FrozenDateRange.from_bytes(self.ranges[0].to_bytes())
+        self.assertIsInstance(frozen, FrozenDateRange)
+        self.assertEqual(hash(self.ranges[0].freeze()), hash(frozen))
+
+    def test_bad_bytes(self):
+        data = self.ranges[0].to_bytes()
+        for bad in (b'', b'XXXX' + data[4:], data[:4] + b'\x02' + data[5:], data[:-1], data + b'\x00'):
+            with self.assertRaises(ValueError):
+                DateRange.from_bytes(bad)
+        write_date_ranges(self.path, self.ranges)
+        with open(self.path, 'rb') as file:
+            with self.assertRaises(ValueError):
+                DateRange.from_bytes(file.read())
+
+    def test_reader(self):
+        write_date_ranges(self.path, self.ranges + [date(2021, 8, 1)])
+        with DateRangeReader(self.path) as reader:
+            self.assertEqual(len(self.ranges) + 1, len(reader))
+            for expected, date_range in zip(self.ranges, reader):
+                self.assertIsInstance(date_range, FrozenDateRange)
+                self.assertIsInstance(date_range._starts, memoryview)
+                self.assertEqual(expected, date_range)
+                self.assertEqual(expected.days, date_range.days)
+                self.assertEqual(hash(expected.freeze()), hash(date_range))
+            self.assertEqual(DateRange(date(2021, 8, 1), date(2021, 8, 1)), reader[-1])
+            with self.assertRaises(IndexError):
+                reader[len(self.ranges) + 1]
+            kept = reader[0]
+        self.assertEqual(self.ranges[0] | self.ranges[4], kept | self.ranges[4])
+        self.assertEqual(self.ranges[0] - self.ranges[4], kept - self.ranges[4])
+        self.assertTrue(all(day in kept for day in self.ranges[0].iter_days()))
+        self.assertEqual(self.ranges[0], kept.thaw())
+
+    def test_pickle(self):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            for date_range in self.ranges:
+                with self.subTest(protocol=protocol, intervals=len(date_range)):
+                    loaded = pickle.loads(pickle.dumps(date_range, protocol))
+                    self.assertIs(DateRange, type(loaded))
+                    self.assertEqual(date_range, loaded)
+                    frozen = pickle.loads(pickle.dumps(date_range.freeze(), protocol))
+                    self.assertIs(FrozenDateRange, type(frozen))
+                    self.assertEqual(hash(date_range.freeze()), hash(frozen))
+            interval = DateRange.Interval(date(2021, 8, 1), date(2021, 8, 31))
+            self.assertEqual(interval, pickle.loads(pickle.dumps(interval, protocol)))
+        self.assertEqual(self.ranges[0], copy.deepcopy(self.ranges[0]))
+        self.assertLess(len(pickle.dumps(self.ranges[0])), len(pickle.dumps(self.ranges[0].intervals)))
+
+    def test_pickle_out_of_band(self):
+        buffers = []
+        data = pickle.dumps(self.ranges[0], 5, buffer_callback=buffers.append)
+        self.assertEqual(2, len(buffers))
+        self.assertLess(len(data), 100)
+        loaded = pickle.loads(data, buffers=buffers)
+        self.assertEqual(self.ranges[0], loaded)
+        loaded += date(1990, 1, 1)
+        self.assertNotIn(date(1990, 1, 1), pickle.loads(data, buffers=buffers))
+
+    def test_pickle_mapped(self):
+        write_date_ranges(self.path, self.ranges)
+        with DateRangeReader(self.path) as reader:
+            data = pickle.dumps(list(reader))
+        self.assertEqual(self.ranges, pickle.loads(data))
+
+    def test_reader_rejects_bad_offsets(self):
+        write_date_ranges(self.path, self.ranges)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        offset = daterange._HEADER.size
+        bad_offsets = [
+            data[:offset] + (1).to_bytes(8, 'little') + data[offset + 8:],
+            data[:offset + 8] + (len(self.ranges[0]) + 1).to_bytes(8, 'little') + data[offset + 16:],
+            data[:-4],
+            data + b'\x00' * 8,
+        ]
+        for bad in bad_offsets:
+            with open(self.path, 'wb') as file:
+                file.write(bad)
+            with self.assertRaises(ValueError):
+                DateRangeReader(self.path)
+
+    def test_reader_rejects_single_range(self):
+        with open(self.path, 'wb') as file:
+            file.write(self.ranges[0].to_bytes())
+        with self.assertRaises(ValueError):
+            DateRangeReader(self.path)
+
+
+class TestBatch(TestCase):
+    operators = {'or': operator.or_, 'and': operator.and_, 'sub': operator.sub, 'xor': operator.xor,
+                 'contains': lambda left, right: right in left}
+
+    def setUp(self) -> None:
+        rng = random.Random(19)
+        self.pairs = [(random_range(rng, rng.randint(0, 8)), random_range(rng, rng.randint(0, 8))) for _ in range(40)]
+        self.pairs += [(self.pairs[0][0].freeze(), self.pairs[0][1]), (date(2021, 8, 1), self.pairs[1][1].freeze()),
+                       (date(2021, 8, 1), self.pairs[2][1]), (self.pairs[3][0], date(2021, 8, 1)),
+                       (DateRange(), DateRange.all_time())]
+
+    def assertMatchesSerial(self, operation, results, pairs):
+        function = self.operators[operation]
+        expected = [function(left, right) for left, right in pairs]
+        self.assertEqual(expected, results)
+        self.assertEqual([type(result) for result in expected], [type(result) for result in results])
+
+    def test_serial(self):
+        for operation in self.operators:
+            with patch.object(daterange, 'ProcessPoolExecutor') as pool:
+                pairs = self.pairs if operation != 'contains' else [pair for pair in self.pairs
+                                                                     if isinstance(pair[0], DateRange)]
+                self.assertMatchesSerial(operation, batch(operation, pairs, processes=1), pairs)
+                self.assertMatchesSerial(operation, batch(operation, pairs, processes=4, chunk_size=100), pairs)
+            pool.assert_not_called()
+
+    def test_processes(self):
+        with ProcessPoolExecutor(2) as executor:
+            for operation in self.operators:
+                with self.subTest(operation=operation):
+                    pairs = self.pairs if operation != 'contains' else [pair for pair in self.pairs
+                                                                         if isinstance(pair[0], DateRange)]
+                    self.assertMatchesSerial(operation, batch(operation, pairs, chunk_size=7, executor=executor), pairs)
+        self.assertMatchesSerial('sub', batch('sub', self.pairs, processes=2, chunk_size=10), self.pairs)
+
+    def test_pool_unavailable(self):
+        with patch.object(daterange, 'ProcessPoolExecutor', side_effect=NotImplementedError):
+            self.assertMatchesSerial('or', batch('or', self.pairs, processes=2, chunk_size=10), self.pairs)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            batch('union', self.pairs)
+        with self.assertRaises(ValueError):
+            batch('or', self.pairs, chunk_size=0)
+        with self.assertRaises(TypeError):
+            batch('contains', [(date(2021, 8, 1), DateRange())])
+        with self.assertRaises(TypeError):
+            batch('or', [(date(2021, 8, 1), date(2021, 8, 2))])
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self) -> None:
+        self.aug = DateRange(date(2021, 8, 1), date(2021, 8, 31))
+        self.sep = DateRange(date(2021, 9, 1), date(2021, 9, 30))
+        self.originals = {name: vars(DateRange)[name] for name in ('__or__', '__ror__', '__iadd__', 'copy')}
+        reset_instrumentation()
+
+    def tearDown(self) -> None:
+        disable_instrumentation()
+        reset_instrumentation()
+
+    def test_disabled(self):
+        self.aug | self.sep
+        self.assertEqual({}, instrumentation_snapshot())
+        for name, original in self.originals.items():
+            self.assertIs(original, vars(DateRange)[name])
+
+    def test_snapshot(self):
+        enable_instrumentation()
+        enable_instrumentation()
+        self.aug | self.sep
+        date(2021, 7, 31) + self.aug
+        self.aug - self.aug.copy()
+        frozen = self.aug.freeze()
+        frozen |= date(2021, 9, 1)
+        self.assertIn(date(2021, 8, 15), self.aug + self.sep)
+        disable_instrumentation()
+        self.aug | self.sep
+
+        snapshot = instrumentation_snapshot()
+        self.assertEqual({'__or__', '__sub__', '__ior__', '__contains__', 'copy', 'type_check'}, set(snapshot))
+        self.assertEqual(3, snapshot['__or__']['calls'])
+        self.assertEqual(1 + 1 + 1 + 1 + 1 + 1, snapshot['__or__']['input_intervals'])
+        self.assertEqual(3, snapshot['__or__']['output_intervals'])
+        self.assertEqual(2, snapshot['__or__']['max_input_intervals'])
+        self.assertEqual(1, snapshot['__ior__']['calls'])
+        self.assertEqual(2, snapshot['type_check']['calls'])
+        self.assertEqual(0, snapshot['__sub__']['output_intervals'])
+        self.assertEqual(1, snapshot['copy']['calls'])
+        self.assertEqual(1, snapshot['__contains__']['calls'])
+        self.assertGreater(snapshot['__or__']['seconds'], 0)
+        self.assertGreaterEqual(snapshot['__or__']['seconds'], snapshot['__or__']['max_seconds'])
+
+        snapshot['__or__']['calls'] = 100
+        self.assertEqual(3, instrumentation_snapshot()['__or__']['calls'])
+        reset_instrumentation()
+        self.assertEqual({}, instrumentation_snapshot())
+        for name, original in self.originals.items():
+            self.assertIs(original, vars(DateRange)[name])
+
+    def test_callbacks(self):
+        events = []
+        enable_instrumentation(events.append)
+        try:
+            (self.aug + self.sep) & self.aug
+        finally:
+            remove_instrumentation_callback(events.append)
+        self.aug & self.sep
+        self.assertEqual(['__or__', '__and__'], [event.operation for event in events])
+        self.assertIsInstance(events[0], OperationEvent)
+        self.assertEqual((2, 1), (events[0].input_intervals, events[0].output_intervals))
+        self.assertEqual((2, 1), (events[1].input_intervals, events[1].output_intervals))
+        self.assertEqual(2, instrumentation_snapshot()['__and__']['calls'])
+
+    def test_type_check_wraps(self):
+        enable_instrumentation()
+        self.assertFalse(self.aug == date(2021, 8, 1))
+        self.assertTrue(self.aug > date(2021, 7, 1))
+        self.assertFalse(self.aug < date(2021, 7, 1))
+        RecurringDateRange.every(date(2021, 8, 1), date(2021, 8, 31), 2) | date(2021, 9, 1)
+        self.assertEqual(4, instrumentation_snapshot()['type_check']['calls'])
+        disable_instrumentation()
+        self.aug == date(2021, 8, 1)
+        self.assertEqual(4, instrumentation_snapshot()['type_check']['calls'])
+
+    def test_in_place_inputs(self):
+        events = []
+        a = DateRange(date(2021, 1, 1), date(2021, 1, 5)) + DateRange(date(2021, 1, 10), date(2021, 1, 15))
+        b = DateRange(date(2021, 1, 20), date(2021, 1, 25))
+        c = a + b
+        d = DateRange(date(2021, 1, 3), date(2021, 1, 22))
+        enable_instrumentation(events.append)
+        try:
+            a |= b
+            c &= d
+        finally:
+            remove_instrumentation_callback(events.append)
+        self.assertEqual(['__ior__', '__iand__'], [event.operation for event in events])
+        self.assertEqual((3, 3), (events[0].input_intervals, events[0].output_intervals))
+        self.assertEqual((4, 3), (events[1].input_intervals, events[1].output_intervals))
+
+    @skipIf(daterange.np is None, 'bitmaps need numpy')
+    def test_bitmaps_not_decoded(self):
+        events = []
+        rng = random.Random(16)
+        first, second = fragmented_range(rng, 200), fragmented_range(rng, 200)
+        expected = len(first | second)
+        enable_instrumentation(events.append)
+        try:
+            union = first | second
+        finally:
+            remove_instrumentation_callback(events.append)
+        self.assertFalse(holds_intervals(union))
+        self.assertEqual((len(first) + len(second), expected), (events[0].input_intervals, events[0].output_intervals))